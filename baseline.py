@@ -0,0 +1,100 @@
+import numpy as np
+
+class StaticBaseline:
+    """
+    One-shot calibration: collects the first frames of each stream in a
+    fixed ring buffer, then the baseline is their mean/std and never changes.
+    Arrays are (streams, AUs).
+    """
+    adaptive = False
+    
+    def __init__(self, n_streams, n_aus, window, min_samples):
+        self.window = int(window)
+        self.min_samples = int(min_samples)
+        self.buffer = np.zeros((n_streams, self.window, n_aus))
+        self.count = np.zeros(n_streams, dtype=np.int64)
+
+    def update(self, X, mask=None):
+        """
+        X: (streams, AUs). mask: (streams,) rows to add (default: all).
+        """
+        rows = np.arange(len(self.count)) if mask is None else np.nonzero(mask)[0]
+        self.buffer[rows, self.count[rows] % self.window] = X[rows]
+        self.count[rows] += 1
+
+    def ready(self):
+        return self.count >= self.min_samples
+
+    def stats(self, stream):
+        n = min(self.count[stream], self.window)
+        buf = self.buffer[stream, :n]
+        return buf.mean(axis=0), buf.std(axis=0)
+
+    def reset(self, streams):
+        self.count[streams] = 0
+
+class OnlineBaseline:
+    """
+    Streaming baseline with O(1) time and memory per frame.
+    
+    mode='welford': running mean/variance over every frame seen so far.
+    mode='ewma':    exponentially weighted mean/variance that follows slow
+                    drift (posture, lighting); half_life is in frames.
+    Both start with Welford until min_samples frames, so the initial
+    estimate matches a static calibration. The per-(stream, AU) mask lets
+    callers freeze AUs while an event is active.
+    """
+    adaptive = True
+    
+    def __init__(self, n_streams, n_aus, min_samples, mode="ewma", half_life=1800):
+        if mode not in ("welford", "ewma"):
+            raise ValueError(f"Unknown baseline mode: {mode}")
+        self.mode = mode
+        self.min_samples = int(min_samples)
+        self.alpha = 1.0 - 0.5 ** (1.0 / half_life)
+        
+        self.count = np.zeros((n_streams, n_aus), dtype=np.int64)
+        self.mean = np.zeros((n_streams, n_aus))
+        self.m2 = np.zeros((n_streams, n_aus)) # Welford sum of squares
+        self.var = np.zeros((n_streams, n_aus))
+
+    def update(self, X, mask=None):
+        """
+        X: (streams, AUs). mask: bool, (streams,) or broadcastable to
+        (streams, AUs); False entries are left untouched (default: update all).
+        """
+        if mask is None:
+            upd = np.ones(self.mean.shape, dtype=bool)
+        else:
+            mask = np.asarray(mask)
+            if mask.ndim == 1: mask = mask[:, None] # per-stream mask
+            upd = np.broadcast_to(mask, self.mean.shape)
+        delta = X - self.mean
+        
+        if self.mode == "ewma":
+            warm = upd & (self.count >= self.min_samples)
+            upd = upd & ~warm
+            if warm.any():
+                incr = self.alpha * delta
+                np.add(self.mean, incr, out=self.mean, where=warm)
+                np.copyto(self.var, (1.0 - self.alpha) * (self.var + delta * incr), where=warm)
+                self.count += warm
+                
+        # Welford step
+        self.count += upd
+        n = np.maximum(self.count, 1)
+        np.add(self.mean, delta / n, out=self.mean, where=upd)
+        np.add(self.m2, delta * (X - self.mean), out=self.m2, where=upd)
+        np.divide(self.m2, n, out=self.var, where=upd)
+
+    def ready(self):
+        return self.count.min(axis=1) >= self.min_samples
+
+    def stats(self, stream):
+        return self.mean[stream], np.sqrt(self.var[stream])
+
+    def reset(self, streams):
+        self.count[streams] = 0
+        self.mean[streams] = 0.0
+        self.m2[streams] = 0.0
+        self.var[streams] = 0.0
@@ -0,0 +1,193 @@
+import os
+import time
+import multiprocessing
+
+from feature_extraction import FeatureExtractor
+from detector import EventDetector, preload_model
+from report_generator import ReportGenerator
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+# Per-worker state, created once by _init_worker and reused for every video
+# the worker picks up (FaceMesh graph setup is expensive).
+_face_mesh = None
+_extractor = None
+
+def _init_worker(max_faces=1):
+    global _face_mesh, _extractor
+    preload_model("flat") # loads while the FaceMesh graph is built
+    import mediapipe as mp
+    _face_mesh = mp.solutions.face_mesh.FaceMesh(
+        max_num_faces=max_faces,
+        refine_landmarks=True,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+    _extractor = FeatureExtractor()
+
+def analyze_video(video_path, output_dir="reports", style="plain", baseline="static",
+                  record_dir=None, record_mode="landmarks", max_faces=1,
+                  smoothing="none", z_exit=None, name=None):
+    """
+    Runs FaceMesh + FeatureExtractor + EventDetector over one video file
+    and writes its report to <output_dir>/<name>_report.txt (name defaults
+    to the file name without extension). Must run in a worker set up by
+    _init_worker. Timestamps come from the video's frame rate, not
+    wall-clock time. With record_dir set, the landmarks (or features) are
+    also saved to <record_dir>/<name> for replay without FaceMesh (first
+    face only).
+    With max_faces > 1 every subject is tracked and reported separately.
+    """
+    import cv2
+    
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return {"video": video_path, "error": "could not open video"}
+        
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    stem = name or os.path.splitext(os.path.basename(video_path))[0]
+    
+    recorder = None
+    if record_dir:
+        from recording import SessionRecorder
+        recorder = SessionRecorder(os.path.join(record_dir, stem), mode=record_mode)
+        
+    if max_faces > 1:
+        from face_tracker import MultiFaceSession
+        session = MultiFaceSession(max_faces, buffer_duration=3.0, classify="deferred",
+                                   baseline=baseline, smoothing=smoothing, z_exit=z_exit)
+    else:
+        session = None
+        detector = EventDetector(buffer_duration=3.0, classify="deferred", baseline=baseline,
+                                 smoothing=smoothing, z_exit=z_exit)
+    
+    t0 = time.time()
+    frame_idx = 0
+    timestamp = 0.0
+    
+    while True:
+        ret, frame = cap.read()
+        if not ret: break
+        
+        timestamp = frame_idx / fps
+        frame_idx += 1
+        
+        h, w, c = frame.shape
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results = _face_mesh.process(rgb_frame)
+        
+        if session:
+            # Every frame, so subjects that left the video are evicted
+            faces = [f.landmark for f in results.multi_face_landmarks] if results.multi_face_landmarks else []
+            session.process(faces, w, h, timestamp)
+            if recorder and faces:
+                features = _extractor.extract(faces[0], w, h)
+                if features:
+                    recorder.record(timestamp, faces[0], w, h, features)
+        elif results.multi_face_landmarks:
+            landmarks = results.multi_face_landmarks[0].landmark
+            features = _extractor.extract(landmarks, w, h)
+            if features:
+                if recorder:
+                    recorder.record(timestamp, landmarks, w, h, features)
+                detector.update(features, timestamp)
+                
+    cap.release()
+    if recorder:
+        recorder.close()
+    gen = ReportGenerator(style=style)
+    if session:
+        subject_logs = session.close()
+        report = gen.generate_multi(subject_logs, timestamp)
+        n_events = sum(len(events) for events in subject_logs.values())
+    else:
+        detector.flush() # one batched classification for the whole video
+        report = gen.generate(detector.event_log, timestamp)
+        n_events = len(detector.event_log)
+    
+    report_path = os.path.join(output_dir, f"{stem}_report.txt")
+    with open(report_path, "w") as f:
+        f.write(report)
+        
+    return {
+        "video": video_path,
+        "report": report_path,
+        "frames": frame_idx,
+        "events": n_events,
+        "elapsed": time.time() - t0
+    }
+
+def _analyze_task(task):
+    # A failing video is reported, not raised: the rest of the batch goes on
+    try:
+        return analyze_video(*task)
+    except Exception as e:
+        return {"video": task[0], "error": f"{type(e).__name__}: {e}"}
+
+def collect_videos(paths):
+    """
+    Expands directories into the video files they contain.
+    """
+    videos = []
+    for p in paths:
+        if os.path.isdir(p):
+            for name in sorted(os.listdir(p)):
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    videos.append(os.path.join(p, name))
+        else:
+            videos.append(p)
+    return videos
+
+def unique_names(videos):
+    """
+    Report/recording name per video: the file name without extension,
+    with _2, _3... appended when videos from different folders share it.
+    """
+    names, seen = [], set()
+    for v in videos:
+        stem = os.path.splitext(os.path.basename(v))[0]
+        name, k = stem, 1
+        while name in seen:
+            k += 1
+            name = f"{stem}_{k}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+def run_batch(paths, output_dir="reports", workers=None, style="plain", baseline="static",
+              record_dir=None, record_mode="landmarks", max_faces=1, smoothing="none", z_exit=None):
+    """
+    Analyses a set of recorded videos across a process pool (one worker
+    per core by default). Each video is one task: the detector's baseline
+    and event state are sequential, so a video is never split across workers.
+    """
+    videos = collect_videos(paths)
+    if not videos:
+        print("Error: No video files found.")
+        return []
+        
+    os.makedirs(output_dir, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, len(videos))
+    
+    print(f"[Batch] {len(videos)} video(s) on {workers} worker(s)")
+    
+    tasks = [(v, output_dir, style, baseline, record_dir, record_mode, max_faces, smoothing, z_exit, name)
+             for v, name in zip(videos, unique_names(videos))]
+    results = []
+    t0 = time.time()
+    
+    # 'spawn' so workers never inherit a forked MediaPipe/OpenCV state
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes=workers, initializer=_init_worker,
+                  initargs=(max_faces,)) as pool:
+        for res in pool.imap_unordered(_analyze_task, tasks):
+            results.append(res)
+            if "error" in res:
+                print(f"[Batch] {res['video']}: {res['error']}")
+            else:
+                fps = res["frames"] / res["elapsed"] if res["elapsed"] > 0 else 0.0
+                print(f"[Batch] {res['video']}: {res['events']} events, "
+                      f"{res['frames']} frames ({fps:.1f} FPS) -> {res['report']}")
+                      
+    print(f"[Batch] Done in {time.time() - t0:.1f}s")
+    return results
@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import numpy as np
+
+from feature_extraction import FeatureExtractor, AU_KEYS
+from detector import EventDetector, MicroEvent, MODEL_DIR
+from report_generator import ReportGenerator
+
+class _Landmark:
+    """
+    Stand-in for MediaPipe's NormalizedLandmark (x, y, z attributes).
+    """
+    __slots__ = ("x", "y", "z")
+    
+    def __init__(self, x, y, z=0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+
+def synthetic_landmarks(n_frames, n_landmarks=478, seed=0):
+    """
+    Returns (points (frames, landmarks, 2) normalized, list of landmark lists).
+    A fixed random face with small per-frame jitter.
+    """
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(0.3, 0.7, size=(n_landmarks, 2))
+    points = (base + rng.normal(0, 0.001, size=(n_frames, n_landmarks, 2))).astype(np.float32)
+    frames = [[_Landmark(float(x), float(y)) for x, y in frame] for frame in points]
+    return points, frames
+
+def synthetic_events(n_events, seed=0):
+    rng = np.random.default_rng(seed)
+    events = []
+    for i in range(n_events):
+        start = i * 0.5 + rng.uniform(0, 0.4)
+        duration = rng.uniform(0.1, 1.0)
+        events.append(MicroEvent(start, start + duration, AU_KEYS[rng.integers(len(AU_KEYS))],
+                                 rng.uniform(2.0, 6.0), duration, "neutral"))
+    return events
+
+def _summarize(samples_ns):
+    us = np.asarray(samples_ns, dtype=np.float64) / 1000.0
+    p50, p95, p99 = np.percentile(us, [50, 95, 99])
+    mean = float(us.mean())
+    return {
+        "n": int(len(us)),
+        "mean_us": mean,
+        "p50_us": float(p50),
+        "p95_us": float(p95),
+        "p99_us": float(p99),
+        "fps": 1e6 / mean if mean > 0 else 0.0
+    }
+
+def _time_calls(fn, args_iter):
+    samples = []
+    clock = time.perf_counter_ns
+    for args in args_iter:
+        t0 = clock()
+        fn(*args)
+        samples.append(clock() - t0)
+    return _summarize(samples)
+
+def _calibrated_detector(features, **kwargs):
+    detector = EventDetector(buffer_duration=3.0, **kwargs)
+    t = 0.0
+    while not detector.calibration_done:
+        detector.update(features[int(t * 30) % len(features)], t)
+        t += 1 / 30
+    return detector, t
+
+def bench_extraction(n_frames):
+    points, frames = synthetic_landmarks(n_frames)
+    ex = FeatureExtractor()
+    w, h = 1280, 720
+    res = {}
+    res["extract"] = _time_calls(ex.extract, ((lms, w, h) for lms in frames))
+    res["extract_vector"] = _time_calls(ex.extract_vector, ((lms, w, h) for lms in frames))
+    
+    # Per-frame cost of one batched call over all frames
+    t0 = time.perf_counter_ns()
+    ex.extract_batch(points, w, h)
+    per_frame = (time.perf_counter_ns() - t0) / n_frames
+    res["extract_batch"] = _summarize([per_frame])
+    return res, [ex.extract(lms, w, h) for lms in frames]
+
+def bench_detector(features, n_frames):
+    res = {}
+    
+    # Calibrating: fresh detector, every frame goes into the baseline
+    det = EventDetector(buffer_duration=3.0)
+    calib = []
+    clock = time.perf_counter_ns
+    for i in range(n_frames):
+        if det.calibration_done:
+            det = EventDetector(buffer_duration=3.0)
+        f = features[i % len(features)]
+        t0 = clock()
+        det.update(f, i / 30)
+        calib.append(clock() - t0)
+    res["update_calibrating"] = _summarize(calib)
+    
+    # Monitoring: calibrated, baseline-like frames, no events
+    det, t = _calibrated_detector(features)
+    res["update_monitoring"] = _time_calls(
+        det.update, ((features[i % len(features)], t + i / 30) for i in range(n_frames)))
+        
+    # Event closing: hold every AU active for 4 frames, time the frame that closes them
+    for mode in ("inline", "deferred"):
+        det, t = _calibrated_detector(features, classify=mode)
+        mean = np.array([det.baseline_stats[k]["mean"] for k in AU_KEYS])
+        std = np.array([det.baseline_stats[k]["std"] for k in AU_KEYS])
+        hot = dict(zip(AU_KEYS, (mean + 10 * std * np.array([1, -1, -1, 1, -1])).tolist()))
+        calm = dict(zip(AU_KEYS, mean.tolist()))
+        
+        closing = []
+        for _ in range(max(n_frames // 10, 50)):
+            for _ in range(4):
+                det.update(hot, t)
+                t += 1 / 30
+            t0 = clock()
+            det.update(calm, t)
+            closing.append(clock() - t0)
+            t += 1 / 30
+        det.close()
+        res[f"update_event_closing_{mode}"] = _summarize(closing)
+    return res
+
+def bench_inference(n_rows):
+    from forest_inference import FlatForest
+    from dataset_cache import load_dataset
+    
+    # Files next to the modules, wherever the benchmark is run from. A
+    # missing model is an error: skipping it would hide it from --compare.
+    X, _ = load_dataset(os.path.join(MODEL_DIR, "dataset.csv")).complete()
+    rows = X[np.arange(n_rows) % len(X)]
+    res = {}
+    
+    flat_path = os.path.join(MODEL_DIR, "emotion_model.npz")
+    pkl_path = os.path.join(MODEL_DIR, "emotion_model.pkl")
+    for path in (flat_path, pkl_path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found (run model_trainer.py)")
+    
+    flat = FlatForest.load(flat_path)
+    res["inference_flat_single"] = _time_calls(flat.predict, ((r[None],) for r in rows))
+    batch = X[:256]
+    res["inference_flat_batch256"] = _time_calls(flat.predict, ((batch,) for _ in range(50)))
+    
+    import pickle
+    import warnings
+    with open(pkl_path, "rb") as f:
+        clf = pickle.load(f)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        res["inference_sklearn_single"] = _time_calls(clf.predict, ((r[None],) for r in rows[:200]))
+    return res
+
+def bench_report(n_events):
+    events = synthetic_events(n_events)
+    res = {}
+    for style in ("plain", "technical"):
+        gen = ReportGenerator(style=style)
+        res[f"report_{style}_{n_events}"] = _time_calls(
+            gen.generate, ((list(events), n_events * 0.5) for _ in range(5)))
+    return res
+
+def run(n_frames=2000, n_events=50000):
+    results = {}
+    extraction, features = bench_extraction(n_frames)
+    results.update(extraction)
+    results.update(bench_detector(features, n_frames))
+    results.update(bench_inference(n_frames))
+    results.update(bench_report(n_events))
+    
+    # Per-frame hot path: extraction + monitoring update
+    hot = results["extract"]["mean_us"] + results["update_monitoring"]["mean_us"]
+    results["hot_path_frame"] = {"mean_us": hot, "fps": 1e6 / hot}
+    
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "frames": n_frames,
+            "events": n_events
+        },
+        "results": results
+    }
+
+def compare(current, baseline, tolerance=0.2, metric="p50_us"):
+    """
+    Flags benchmarks whose latency grew by more than tolerance (ratio)
+    against a stored baseline. Returns a list of (name, old, new, ratio).
+    """
+    regressions = []
+    for name, cur in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        key = metric if metric in cur else "mean_us"
+        if not old or key not in old or old[key] <= 0:
+            continue
+        ratio = cur[key] / old[key]
+        if ratio > 1.0 + tolerance:
+            regressions.append((name, old[key], cur[key], ratio))
+    return regressions
+
+def print_results(report):
+    print(f"{'Benchmark':<32} | {'FPS':>10} | {'p50 (us)':>10} | {'p95 (us)':>10} | {'p99 (us)':>10}")
+    print("-" * 84)
+    for name, r in report["results"].items():
+        print(f"{name:<32} | {r['fps']:>10.1f} | {r.get('p50_us', r['mean_us']):>10.1f} | "
+              f"{r.get('p95_us', float('nan')):>10.1f} | {r.get('p99_us', float('nan')):>10.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the per-frame hot path (no webcam needed)")
+    parser.add_argument("--frames", type=int, default=2000, help="Synthetic frames per benchmark")
+    parser.add_argument("--events", type=int, default=50000, help="Events in the report benchmark")
+    parser.add_argument("--output", default="benchmark.json", help="Results file (JSON)")
+    parser.add_argument("--compare", metavar="BASELINE", default=None,
+                        help="Baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown ratio before flagging (0.2 = 20%%)")
+    args = parser.parse_args()
+    
+    try:
+        report = run(args.frames, args.events)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print_results(report)
+    
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS (> {args.tolerance * 100:.0f}% slower than {args.compare}):")
+            for name, old, new, ratio in regressions:
+                print(f"  {name:<32} {old:10.1f}us -> {new:10.1f}us  (x{ratio:.2f})")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}.")
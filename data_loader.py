@@ -1,64 +1,39 @@
-import pandas as pd
-import numpy as np
+from dataset_cache import AU_COLUMNS, load_dataset, column_stats
 
 def analyze_dataset(csv_path):
     """
     Reads the dataset and computes statistics for calibration.
+    Only the AU columns are loaded, from the binary cache after the first run.
     """
     try:
-        df = pd.read_csv(csv_path)
+        ds = load_dataset(csv_path)
     except Exception as e:
         print(f"Error reading CSV: {e}")
         return None
 
-    # Relevant Action Units
-    au_columns = [
-        'AU01_inner_brow_raise', 
-        'AU04_brow_lower', 
-        'AU06_cheek_raise', 
-        'AU12_lip_corner_pull', 
-        'AU15_lip_corner_depress'
-    ]
-    
     stats = {}
     
     print("--- DATASET ANALYSIS ---")
-    print(f"Total Rows: {len(df)}")
+    print(f"Total Rows: {len(ds)}")
     
-    for au in au_columns:
-        if au not in df.columns:
+    for au in AU_COLUMNS:
+        if au not in ds.columns:
             print(f"Warning: {au} not found in CSV.")
-            continue
             
-        data = df[au]
-        
-        # Calculate Stats
-        mean_val = data.mean()
-        std_val = data.std()
-        max_val = data.max()
-        p75 = np.percentile(data, 75)
-        p90 = np.percentile(data, 90)
-        p95 = np.percentile(data, 95)
-        
+    # All columns in one pass
+    col = column_stats(ds.X)
+    
+    for i, au in enumerate(ds.columns):
         stats[au] = {
-            "mean": mean_val,
-            "std": std_val,
-            "high_threshold": p90, # We use Top 10% as likely "Active" events
-            "max": max_val
+            "mean": col["mean"][i],
+            "std": col["std"][i],
+            "high_threshold": col["p90"][i], # We use Top 10% as likely "Active" events
+            "max": col["max"][i]
         }
         
         print(f"\n{au}:")
-        print(f"  Mean: {mean_val:.2f} | Std: {std_val:.2f}")
-        print(f"  75th: {p75:.2f} | 90th: {p90:.2f} (Proposed Threshold)")
-        
-    # Analyze Duration? 
-    # Use 'timestamp' and 'video_clip_id'. 
-    # If we assume rows are sequential frames? The timestamp delta is helpful.
-    # Let's check avg timestamp delta
-    if 'timestamp' in df.columns and len(df) > 1:
-        # Sort by clip and timestamp just in case
-        # But CSV looks mixed. 
-        pass
+        print(f"  Mean: {col['mean'][i]:.2f} | Std: {col['std'][i]:.2f}")
+        print(f"  75th: {col['p75'][i]:.2f} | 90th: {col['p90'][i]:.2f} (Proposed Threshold)")
         
     return stats
 
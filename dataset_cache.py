@@ -0,0 +1,158 @@
+import os
+import json
+import numpy as np
+
+# Columns the detector and the emotion model use
+AU_COLUMNS = [
+    'AU01_inner_brow_raise',
+    'AU04_brow_lower',
+    'AU06_cheek_raise',
+    'AU12_lip_corner_pull',
+    'AU15_lip_corner_depress'
+]
+LABEL_COLUMN = 'emotion_predicted'
+
+CACHE_VERSION = 1
+
+# Files the cache writes (derived caches: DERIVED_PREFIX*.npy)
+CACHE_FILES = ("X.npy", "codes.npy", "classes.npy", "meta.json")
+DERIVED_PREFIX = "folds_"
+
+class Dataset:
+    """
+    Columnar view of the training CSV.
+    X       - (rows, features) float64, memory-mapped, NaN where missing
+    codes   - (rows,) int32 label codes, -1 where the label is missing
+    classes - label names (codes index into it)
+    cache_dir holds the .npy files; derived caches (fold splits, named
+    DERIVED_PREFIX*.npy) may be stored there too and are removed when
+    the cache is rebuilt.
+    """
+    def __init__(self, X, codes, classes, columns, cache_dir=None):
+        self.X = X
+        self.codes = codes
+        self.classes = classes
+        self.columns = columns
+        self.cache_dir = cache_dir
+
+    def __len__(self):
+        return len(self.X)
+
+    @property
+    def labels(self):
+        return self.classes[self.codes]
+
+    def complete(self):
+        """
+        Rows with every feature and the label present.
+        Returns (X, y) as in-memory arrays.
+        """
+        mask = (self.codes >= 0) & ~np.isnan(self.X).any(axis=1)
+        return np.asarray(self.X[mask]), self.classes[self.codes[mask]]
+
+    def iter_complete(self, rows, chunk_rows):
+        """
+        Yields (X, y) for the given row indices, chunk_rows at a time,
+        reading only those rows from the memory map. Incomplete rows are
+        dropped.
+        """
+        for i in range(0, len(rows), chunk_rows):
+            idx = np.sort(rows[i:i + chunk_rows])
+            X = np.asarray(self.X[idx])
+            codes = np.asarray(self.codes[idx])
+            mask = (codes >= 0) & ~np.isnan(X).any(axis=1)
+            yield X[mask], self.classes[codes[mask]]
+
+def _cache_dir(csv_path):
+    head, tail = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(head, f".{tail}.cache")
+
+def _source_key(csv_path):
+    st = os.stat(csv_path)
+    return {"version": CACHE_VERSION, "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+def build_cache(csv_path, columns=AU_COLUMNS, label=LABEL_COLUMN, cache_dir=None):
+    """
+    Parses the CSV once (only the requested columns) and writes the
+    typed .npy cache. Columns missing from the CSV are skipped.
+    """
+    import pandas as pd
+    
+    cache_dir = cache_dir or _cache_dir(csv_path)
+    header = pd.read_csv(csv_path, nrows=0).columns
+    present = [c for c in columns if c in header]
+    usecols = present + ([label] if label in header else [])
+    
+    df = pd.read_csv(csv_path, usecols=usecols, dtype={c: np.float64 for c in present})
+    X = np.ascontiguousarray(df[present].to_numpy(dtype=np.float64))
+    if label in header:
+        codes, classes = pd.factorize(df[label], sort=True)
+        classes = np.asarray(classes, dtype=str)
+    else:
+        codes, classes = np.full(len(df), -1), np.array([], dtype=str)
+        
+    os.makedirs(cache_dir, exist_ok=True)
+    # Only our own files: cache_dir may be shared (e.g. ".")
+    for name in os.listdir(cache_dir):
+        if name in CACHE_FILES or (name.startswith(DERIVED_PREFIX) and name.endswith(".npy")):
+            os.remove(os.path.join(cache_dir, name))
+    np.save(os.path.join(cache_dir, "X.npy"), X)
+    np.save(os.path.join(cache_dir, "codes.npy"), codes.astype(np.int32))
+    np.save(os.path.join(cache_dir, "classes.npy"), classes)
+    meta = dict(_source_key(csv_path), requested=list(columns), columns=present, label=label)
+    # Written last: a cache without meta.json is rebuilt
+    with open(os.path.join(cache_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+def load_dataset(csv_path, columns=AU_COLUMNS, label=LABEL_COLUMN, cache_dir=None, rebuild=False):
+    """
+    Returns a Dataset for csv_path, served from the binary cache when it
+    is newer than the CSV (mtime and size match) and was built for the
+    same columns. Otherwise the cache is (re)built first. Requested
+    columns missing from the CSV are left out of Dataset.columns.
+    """
+    cache_dir = cache_dir or _cache_dir(csv_path)
+    meta_path = os.path.join(cache_dir, "meta.json")
+    
+    meta = None
+    if not rebuild and os.path.exists(meta_path):
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except:
+            meta = None
+    key = _source_key(csv_path)
+    if (meta is None or any(meta.get(k) != v for k, v in key.items())
+            or meta.get("requested") != list(columns) or meta.get("label") != label):
+        meta = build_cache(csv_path, columns, label, cache_dir)
+        
+    X = np.load(os.path.join(cache_dir, "X.npy"), mmap_mode="r")
+    codes = np.load(os.path.join(cache_dir, "codes.npy"), mmap_mode="r")
+    classes = np.load(os.path.join(cache_dir, "classes.npy"))
+    return Dataset(X, codes, classes, meta["columns"], cache_dir)
+
+def column_stats(X, percentiles=(75, 90, 95)):
+    """
+    Per-column mean, std (ddof=1, as pandas), max and percentiles in one
+    vectorized pass over the (rows, columns) array. NaNs are ignored.
+    Returns a dict of (columns,) arrays; percentiles under 'p75' etc.
+    """
+    X = np.asarray(X)
+    if np.isnan(X).any():
+        stats = {
+            "mean": np.nanmean(X, axis=0),
+            "std": np.nanstd(X, axis=0, ddof=1),
+            "max": np.nanmax(X, axis=0),
+        }
+        pct = np.nanpercentile(X, percentiles, axis=0)
+    else:
+        stats = {
+            "mean": X.mean(axis=0),
+            "std": X.std(axis=0, ddof=1),
+            "max": X.max(axis=0),
+        }
+        pct = np.percentile(X, percentiles, axis=0)
+    for p, row in zip(percentiles, pct):
+        stats[f"p{p}"] = row
+    return stats
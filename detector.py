@@ -1,7 +1,22 @@
+import os
 import numpy as np
 import time
-from collections import deque
+import threading
 from dataclasses import dataclass
+from feature_extraction import AU_KEYS
+from baseline import StaticBaseline, OnlineBaseline
+from filters import make_filter
+
+# The Random Forest is trained on RAW features from the CSV (mean ~2.5),
+# while FeatureExtractor returns distance/IOD ratios (mean ~0.5).
+# Domain shift: we re-scale our inputs by ~5.0 to align ranges roughly.
+# Models saved by model_trainer carry their own scale; this is the fallback.
+FEATURE_SCALE = 5.0
+
+# Direction of action per AU (AU_KEYS order): +1 triggers when the ratio
+# rises above baseline, -1 when it drops below.
+# AU01 (Raise) +, AU04 (Frown) -, AU06 (Squint) -, AU12 (Smile) +, AU15 (Depress) -
+AU_DIRECTION = np.array([1.0, -1.0, -1.0, 1.0, -1.0])
 
 @dataclass
 class MicroEvent:
@@ -12,145 +27,587 @@ class MicroEvent:
     duration: float
     emotion_label: str = "unknown"
 
-class EventDetector:
-    def __init__(self, buffer_duration=5.0):
-        # ... (buffer init)
-        self.buffer_size = 30 * buffer_duration 
-        self.baseline_buffers = {
-            "AU01": deque(maxlen=int(self.buffer_size)),
-            "AU04": deque(maxlen=int(self.buffer_size)),
-            "AU06": deque(maxlen=int(self.buffer_size)),
-            "AU12": deque(maxlen=int(self.buffer_size)),
-            "AU15": deque(maxlen=int(self.buffer_size))
-        }
+class DetectionCore:
+    """
+    Vectorized event state machine for many streams x AUs.
+    
+    Baseline mean/std, active flags, start times, peak Z and the feature
+    vector at the peak are (streams, AUs) arrays, so Z-scores and state
+    transitions for every AU of every stream are computed in one step.
+    
+    Hysteresis: an event opens when Z rises above z_threshold (enter) and
+    closes only when it falls to z_exit or below (default: same threshold).
+    With z_exit, min_duration applies to the longest stretch the event
+    spent above z_threshold, so held dips cannot stretch jitter blips into
+    an event: it only merges events that would have passed on their own.
+    Counters of suppressed transitions are kept in `counts`.
+    """
+    def __init__(self, n_streams=1, direction=AU_DIRECTION,
+                 z_threshold=2.0, min_duration=0.1, max_duration=1.0, z_exit=None):
+        self.direction = np.asarray(direction, dtype=np.float64)
+        n_aus = len(self.direction)
+        self.n_streams = n_streams
         
-        self.baseline_stats = {}
-        self.calibration_done = False
-        self.active_events = {} 
-        self.event_log = []
+        self.z_threshold = z_threshold
+        self.z_exit = z_exit
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        
+        self.mean = np.zeros((n_streams, n_aus))
+        self.std = np.ones((n_streams, n_aus))
+        self.calibrated = np.zeros(n_streams, dtype=bool)
         
-        self.Z_THRESHOLD = 2.0 
-        self.MIN_DURATION = 0.1 
-        self.MAX_DURATION = 1.0 
+        self.active = np.zeros((n_streams, n_aus), dtype=bool)
+        self.start = np.zeros((n_streams, n_aus))
+        self.peak_z = np.zeros((n_streams, n_aus))
+        self.peak_vec = np.zeros((n_streams, n_aus, n_aus))
+        self.above = np.zeros((n_streams, n_aus), dtype=bool) # Z > z_threshold last frame
+        # Open events: current and longest stretch above z_threshold (seconds)
+        self.above_run = np.zeros((n_streams, n_aus))
+        self.above_time = np.zeros((n_streams, n_aus))
+        self.last_ts = np.zeros(n_streams)
+        self.raw_hot = np.zeros((n_streams, n_aus), dtype=bool)
+        
+        # opened: events opened. held: dips below z_threshold that hysteresis
+        # kept open (each would have closed/split an event).
+        # too_short / too_long: closed events dropped by the duration check.
+        # raw_opened: openings the unfiltered signal would have had (only
+        # counted when step() gets raw=...; raw_opened - opened = onsets
+        # removed by smoothing).
+        self.counts = dict.fromkeys(("opened", "held", "too_short", "too_long", "raw_opened"), 0)
+
+    def set_baseline(self, streams, mean, std):
+        """
+        Sets the baseline of the given stream(s) and marks them calibrated.
+        """
+        std = np.where(np.asarray(std) == 0, 0.001, std)
+        self.mean[streams] = mean
+        self.std[streams] = std
+        self.calibrated[streams] = True
+
+    def reset(self, streams):
+        """
+        Drops baseline and open events of the given stream(s).
+        """
+        self.calibrated[streams] = False
+        self.active[streams] = False
+        self.above[streams] = False
+        self.raw_hot[streams] = False
+
+    def step(self, X, timestamps, valid=None, raw=None):
+        """
+        X: (streams, AUs) features for this frame.
+        timestamps: scalar or (streams,).
+        valid: (streams,) mask of streams with a frame this step
+               (default: all calibrated streams). Other streams keep their state.
+        raw: optional unfiltered features, when X is smoothed; only used
+             for the raw_opened counter.
+               
+        Returns the events that closed and passed the duration check, as
+        (stream_idx, au_idx, start, end, peak_z, peak_vec) arrays.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        ts = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), (self.n_streams,))
+        live = self.calibrated if valid is None else (np.asarray(valid) & self.calibrated)
+        live = live[:, None]
         
-        # Load Model
+        # Signed Z: positive = action in the AU's direction
+        z = (X - self.mean) / self.std * self.direction
+        above = (z > self.z_threshold) & live
+        if self.z_exit is None:
+            hot = above
+        else:
+            # Open events stay hot down to z_exit
+            hot = above | (self.active & (z > self.z_exit) & live)
+            held = self.active & hot & ~above & self.above
+            self.counts["held"] += int(np.count_nonzero(held))
+            # Stretch above z_threshold: from its first frame to the first below
+            dt = (ts - self.last_ts)[:, None]
+            np.add(self.above_run, dt, out=self.above_run, where=self.active & self.above & live)
+            np.maximum(self.above_time, self.above_run, out=self.above_time)
+            np.copyto(self.above_run, 0.0, where=~above & live)
+            np.copyto(self.last_ts, ts, where=live[:, 0])
+        np.copyto(self.above, above, where=live)
+        
+        if raw is not None:
+            z_raw = (np.asarray(raw, dtype=np.float64) - self.mean) / self.std * self.direction
+            raw_hot = (z_raw > self.z_threshold) & live
+            self.counts["raw_opened"] += int(np.count_nonzero(raw_hot & ~self.raw_hot))
+            np.copyto(self.raw_hot, raw_hot, where=live)
+        
+        opening = hot & ~self.active
+        np.copyto(self.start, ts[:, None], where=opening)
+        np.copyto(self.above_run, 0.0, where=opening)
+        np.copyto(self.above_time, 0.0, where=opening)
+        
+        better = hot & (opening | (z > self.peak_z))
+        np.copyto(self.peak_z, z, where=better)
+        if better.any():
+            s_idx, a_idx = np.nonzero(better)
+            self.peak_vec[s_idx, a_idx] = X[s_idx]
+            self.counts["opened"] += int(np.count_nonzero(opening))
+            
+        closing = self.active & ~hot & live
+        self.active = hot | (self.active & ~live)
+        
+        if not closing.any():
+            return _NO_EVENTS
+            
+        s_idx, a_idx = np.nonzero(closing)
+        start = self.start[s_idx, a_idx]
+        end = ts[s_idx]
+        duration = end - start
+        if self.z_exit is None:
+            short = duration < self.min_duration
+        else:
+            short = self.above_time[s_idx, a_idx] < self.min_duration
+        long = duration > self.max_duration
+        keep = ~short & ~long
+        self.counts["too_short"] += int(np.count_nonzero(short))
+        self.counts["too_long"] += int(np.count_nonzero(long))
+        
+        s_idx, a_idx = s_idx[keep], a_idx[keep]
+        return (s_idx, a_idx, start[keep], end[keep],
+                self.peak_z[s_idx, a_idx], self.peak_vec[s_idx, a_idx])
+
+# Model files live next to this module, independent of the working directory
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _load_model(backend):
+    model = None
+    if backend == "flat":
+        from forest_inference import FlatForest
+        try:
+            model = FlatForest.load(os.path.join(MODEL_DIR, "emotion_model.npz"))
+            print("[System] Emotion Model Loaded (flat).")
+        except:
+            print("[Warning] Flat model not found, using sklearn model.")
+            
+    if model is None:
         import pickle
         try:
-            with open("emotion_model.pkl", "rb") as f:
-                self.model = pickle.load(f)
+            with open(os.path.join(MODEL_DIR, "emotion_model.pkl"), "rb") as f:
+                model = pickle.load(f)
             print("[System] Emotion Model Loaded.")
         except:
             print("[Warning] Emotion Model not found.")
-            self.model = None
+            model = None
+    return model
+
+class _ModelSlot:
+    """
+    One model load per process and backend, run on a background thread.
+    get() waits for it to finish.
+    """
+    def __init__(self, backend):
+        self.model = None
+        self._done = threading.Event()
+        threading.Thread(target=self._load, args=(backend,), daemon=True).start()
+        
+    def _load(self, backend):
+        try:
+            self.model = _load_model(backend)
+        finally:
+            self._done.set()
+            
+    def ready(self):
+        return self._done.is_set()
+        
+    def get(self):
+        self._done.wait()
+        return self.model
+
+_model_slots = {}
+_model_slots_lock = threading.Lock()
+
+def preload_model(backend="flat"):
+    """
+    Starts loading the emotion model in the background (once per process
+    and backend) and returns its slot. Every EmotionClassifier with the
+    same backend shares the loaded model. Calling this early lets the load
+    overlap with camera/FaceMesh setup and calibration.
+    """
+    with _model_slots_lock:
+        slot = _model_slots.get(backend)
+        if slot is None:
+            slot = _model_slots[backend] = _ModelSlot(backend)
+        return slot
+
+_NO_EVENTS = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp),
+              np.zeros(0), np.zeros(0), np.zeros(0), np.zeros((0, len(AU_KEYS))))
+
+class EmotionClassifier:
+    """
+    Predicts the emotional context of closed events from their peak-frame
+    feature vector, and owns the model.
+    
+    backend: 'flat' - NumPy forest (emotion_model.npz), falls back to sklearn.
+             'sklearn' - pickled RandomForestClassifier (reference implementation).
+    mode:    'inline' - classified as soon as the event closes.
+             'deferred' - queued, classified in one batch by flush().
+             'background' - queued, classified in batches by a worker thread.
+    Queued events carry emotion_label "pending" until classified.
+    The model is loaded in the background and shared process-wide (see
+    preload_model); the first classification waits for it if needed.
+    """
+    def __init__(self, backend="flat", mode="inline"):
+        self._model_slot = preload_model(backend)
+                
+        if mode not in ("inline", "deferred", "background"):
+            raise ValueError(f"Unknown classify mode: {mode}")
+        self.mode = mode
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._classify_lock = threading.Lock()
+        self._worker = None
+        
+        if mode == "background":
+            self._wake = threading.Event()
+            self._closing = False
+            self._worker = threading.Thread(target=self._classify_loop, daemon=True)
+            self._worker.start()
+
+    @property
+    def model(self):
+        return self._model_slot.get()
+        
+    @property
+    def feature_scale(self):
+        # Feature scaling saved with the model (older models: FEATURE_SCALE)
+        return getattr(self.model, "feature_scale_", None) or FEATURE_SCALE
+
+    def submit(self, evt, peak_vec):
+        # Queued modes don't wait here for a model that is still loading
+        if (self.mode == "inline" or self._model_slot.ready()) and self.model is None:
+            return
+        if self.mode == "inline":
+            self._classify_batch([(evt, peak_vec)])
+            return
+            
+        evt.emotion_label = "pending"
+        with self._pending_lock:
+            self._pending.append((evt, peak_vec))
+        if self._worker is not None:
+            self._wake.set()
+
+    def _classify_batch(self, batch):
+        # One predict call for the whole batch, on peak-frame features
+        if self.model is None:
+            for evt, _ in batch: evt.emotion_label = "unknown"
+            return
+        X = np.array([vec for _, vec in batch]) * self.feature_scale
+        try:
+            labels = self.model.predict(X)
+        except:
+            labels = ["unknown"] * len(batch)
+        for (evt, _), label in zip(batch, labels):
+            evt.emotion_label = str(label)
+
+    def flush(self):
+        """
+        Classifies every queued event in one batched call and waits for any
+        batch the background worker is already running.
+        Returns the number of events classified.
+        """
+        with self._classify_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if batch:
+                self._classify_batch(batch)
+        return len(batch)
+
+    def _classify_loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            self.flush()
+            if self._closing: break
+
+    def close(self):
+        """
+        Classifies any queued events and stops the background worker.
+        """
+        if self._worker is not None:
+            self._closing = True
+            self._wake.set()
+            self._worker.join()
+            self._worker = None
+        self.flush()
+
+class EventDetector:
+    """
+    Single-subject event detection: a one-stream MultiStreamDetector with
+    the per-frame API (update(features) / update_vector(vec)) and the
+    calibration status the live loop displays.
+    """
+    def __init__(self, buffer_duration=5.0, backend="flat", classify="inline",
+                 baseline="static", baseline_half_life=60.0, sink=None, keep_log=None,
+                 smoothing="none", smoothing_params=None, z_exit=None):
+        self.buffer_size = 30 * buffer_duration
+        self.streams = MultiStreamDetector(1, buffer_duration, backend, classify, baseline,
+                                           baseline_half_life, sink=sink, keep_log=keep_log,
+                                           smoothing=smoothing, smoothing_params=smoothing_params,
+                                           z_exit=z_exit)
+        self.baseline_stats = {}
+        self.calibration_done = False
+
+    # State lives in the one-stream detector; kept as attributes for existing callers.
+    @property
+    def core(self): return self.streams.core
+    @property
+    def baseline(self): return self.streams.baseline
+    @property
+    def smoother(self): return self.streams.smoother
+    @property
+    def classifier(self): return self.streams.classifier
+    @property
+    def sink(self): return self.streams.sink
+    @property
+    def keep_log(self): return self.streams.keep_log
+    @property
+    def event_log(self): return self.streams.event_logs[0]
+    
+    @property
+    def metrics(self): return self.streams.metrics
+    @metrics.setter
+    def metrics(self, m): self.streams.metrics = m
+
+    # Thresholds live in the core; kept as attributes for existing callers.
+    @property
+    def Z_THRESHOLD(self): return self.core.z_threshold
+    @Z_THRESHOLD.setter
+    def Z_THRESHOLD(self, v): self.core.z_threshold = v
+    
+    @property
+    def MIN_DURATION(self): return self.core.min_duration
+    @MIN_DURATION.setter
+    def MIN_DURATION(self, v): self.core.min_duration = v
+    
+    @property
+    def MAX_DURATION(self): return self.core.max_duration
+    @MAX_DURATION.setter
+    def MAX_DURATION(self, v): self.core.max_duration = v
 
     def update(self, features, timestamp):
         """
         Ingest features, update baseline (if calibrating), check for events.
         """
-        if not self.calibration_done:
-            # Accumulate baseline
-            for k, v in features.items():
-                self.baseline_buffers[k].append(v)
-                
-            # Check sufficiency
-            if len(self.baseline_buffers["AU01"]) >= 30 * 2: # 2 seconds min
-                self._compute_baseline()
-            return []
+        return self.update_vector([features[k] for k in AU_KEYS], timestamp)
 
-        # Detection Logic
-        detected = []
+    def update_vector(self, vec, timestamp):
+        """
+        Same as update(), with features as a sequence ordered like AU_KEYS
+        (e.g. from FeatureExtractor.extract_vector).
+        """
+        detected = self.streams.update(np.asarray(vec, dtype=np.float64)[None], timestamp)
+        if not self.calibration_done and self.streams.calibrated[0]:
+            self._compute_baseline()
+        return [evt for _, evt in detected]
+
+    @property
+    def model(self):
+        return self.classifier.model
+
+    @property
+    def transition_counts(self):
+        """
+        Event transition counters (see DetectionCore.counts).
+        """
+        return self.streams.transition_counts
+
+    def poll(self):
+        return self.streams.poll()
+
+    def flush(self):
+        """
+        Classifies every queued event (see EmotionClassifier.flush).
+        """
+        return self.streams.flush()
+
+    def close(self):
+        """
+        Classifies any queued events and stops the background worker.
+        Closes the sink, if any.
+        """
+        self.streams.close()
+
+    def _compute_baseline(self):
+        print("[System] Calibration Complete. Monitoring...")
+        mean, std = self.baseline.stats(0)
+        for i, au in enumerate(AU_KEYS):
+            self.baseline_stats[au] = {
+                "mean": mean[i],
+                "std": std[i]
+            }
+        self.calibration_done = True
+
+class MultiStreamDetector:
+    """
+    Event detection for several subjects/streams in one vectorized pass.
+    
+    Each stream slot has its own calibration, baseline, open events and
+    event log (event_store.EventStore). Slots are independent: a stream
+    calibrates on its own first frames, and reset_stream() frees a slot
+    for a new subject. The emotion classifier (and model) is shared by
+    all streams.
+    """
+    def __init__(self, n_streams, buffer_duration=5.0, backend="flat", classify="inline",
+                 baseline="static", baseline_half_life=60.0, classifier=None, sink=None,
+                 keep_log=None, smoothing="none", smoothing_params=None, z_exit=None):
+        self.n_streams = n_streams
         
-        for au, val in features.items():
-            mean = self.baseline_stats[au]['mean']
-            std = self.baseline_stats[au]['std']
-            if std == 0: std = 0.001
-            
-            z_score = (val - mean) / std
-            
-            # AU01 (Raise): Trig if Z > T
-            # AU04 (Frown): Trig if Z < -T (Distance shrinks)
-            # AU06 (Squint): Trig if Z < -T (Distance shrinks)
-            # AU12 (Smile): Trig if Z > T
-            # AU15 (Depress): Trig if Z < -T (Corners go down -> Dist to chin drops? Wait)
-            #   Dist M_Corner to Chin. Norm pose: X. Frown: Corners down -> X decreases.
+        # Baseline (all modes calibrate on the first 2 seconds):
+        # 'static': one-shot mean/std over the calibration window.
+        # 'welford': running mean/std over the whole session.
+        # 'ewma': exponentially weighted mean/std (half-life in seconds),
+        #         follows slow drift. Online modes freeze AUs during events.
+        min_samples = 30 * 2 # 2 seconds min
+        if baseline == "static":
+            self.baseline = StaticBaseline(n_streams, len(AU_KEYS), 30 * buffer_duration, min_samples)
+        else:
+            self.baseline = OnlineBaseline(n_streams, len(AU_KEYS), min_samples, mode=baseline,
+                                           half_life=30 * baseline_half_life)
+        
+        # Vectorized state machine holding baseline, thresholds and open
+        # events for all AUs of all streams.
+        self.core = DetectionCore(n_streams=n_streams, z_threshold=2.0,
+                                  min_duration=0.1, max_duration=1.0, z_exit=z_exit)
+        
+        # Optional smoothing of the raw features ('ema', 'one_euro',
+        # 'savgol'; see filters.py), applied before Z-scoring
+        self.smoother = make_filter(smoothing, n_streams, len(AU_KEYS), **(smoothing_params or {}))
+        
+        # Columnar logs (one EventStore per stream); events are EventRecord views
+        from event_store import EventStore
+        self.event_logs = [EventStore() for _ in range(n_streams)]
+        
+        # Optional event_sink.EventSink: closed events are streamed to disk
+        # (with their stream when there are several). With a sink, the
+        # event logs are not kept unless keep_log=True.
+        self.sink = sink
+        self.keep_log = sink is None if keep_log is None else keep_log
+        
+        # Emotion classification of closed events (see EmotionClassifier)
+        self.classifier = classifier or EmotionClassifier(backend, classify)
+        
+        # Optional instrumentation.Metrics (None = no timing overhead)
+        self.metrics = None
+
+    @property
+    def calibrated(self):
+        return self.core.calibrated
+
+    @property
+    def transition_counts(self):
+        return dict(self.core.counts)
+
+    def update(self, X, timestamps, valid=None):
+        """
+        X: (streams, AUs) features, ordered like AU_KEYS.
+        timestamps: scalar or (streams,).
+        valid: (streams,) mask of slots with a face this frame; NaN rows
+               are treated as missing too.
+        Returns the closed events as a list of (stream, event).
+        """
+        if self.metrics is None:
+            detected = self._update(X, timestamps, valid)
+        else:
+            t0 = time.perf_counter()
+            detected = self._update(X, timestamps, valid)
+            self.metrics.record("detect", time.perf_counter() - t0)
+        if self.sink is not None:
+            self.poll()
+        return detected
+
+    def _update(self, X, timestamps, valid):
+        X = np.asarray(X, dtype=np.float64)
+        ok = ~np.isnan(X).any(axis=1)
+        if valid is not None: ok &= np.asarray(valid)
+        if not ok.all():
+            X = np.where(ok[:, None], X, 0.0)
+        # The baseline (mean/std) is taken on the raw features, events on
+        # the smoothed ones, so smoothing lowers the noise against the threshold
+        F, raw = X, None
+        if self.smoother is not None:
+            F, raw = self.smoother.update(X, timestamps, ok), X
+        
+        # Streams already calibrated are monitored; the rest accumulate baseline
+        monitor = ok & self.core.calibrated
+        calib = ok & ~self.core.calibrated
+        
+        if calib.any():
+            self.baseline.update(X, calib)
+            for s in np.nonzero(calib & self.baseline.ready())[0]:
+                self.core.set_baseline(s, *self.baseline.stats(s))
+                
+        if not monitor.any():
+            return []
             
-            is_active = False
-            intensity = 0.0
+        # Detection Logic (all AUs of all streams in one vectorized step)
+        s_idx, a_idx, starts, ends, peaks, peak_vecs = self.core.step(F, timestamps, valid=monitor, raw=raw)
+        
+        if self.baseline.adaptive:
+            # O(1) baseline update, frozen for AUs with an open event
+            self.baseline.update(X, monitor[:, None] & ~self.core.active)
+            self.core.set_baseline(monitor, *self.baseline.stats(monitor))
             
-            if au in ["AU01", "AU12"]:
-                if z_score > self.Z_THRESHOLD:
-                    is_active = True
-                    intensity = z_score
+        detected = []
+        for i in range(len(a_idx)):
+            s = int(s_idx[i])
+            start, end = float(starts[i]), float(ends[i])
+            if self.keep_log:
+                evt = self.event_logs[s].add(start, end, a_idx[i], float(peaks[i]))
             else:
-                if z_score < -self.Z_THRESHOLD:
-                    is_active = True
-                    intensity = abs(z_score)
-            
-            # State Machine
-            if is_active:
-                if au not in self.active_events:
-                    self.active_events[au] = {
-                        "start": timestamp,
-                        "peak_z": intensity
-                    }
+                evt = MicroEvent(start, end, AU_KEYS[a_idx[i]], float(peaks[i]), end - start)
+            self.classifier.submit(evt, peak_vecs[i])
+            if self.sink is not None:
+                if self.n_streams > 1:
+                    self.sink.write(evt, stream=s)
                 else:
-                    # Update peak
-                    self.active_events[au]['peak_z'] = max(self.active_events[au]['peak_z'], intensity)
-            else:
-                if au in self.active_events:
-                    # Event Ended
-                    start = self.active_events[au]['start']
-                    duration = timestamp - start
-                    peak = self.active_events[au]['peak_z']
-                    
-                    if duration >= self.MIN_DURATION and duration <= self.MAX_DURATION:
-                        # Predict Emotion for this snapshot
-                        emotion = "unknown"
-                        if self.model:
-                            # Construct vector [01, 04, 06, 12, 15]
-                            # Ideally we want the values AT THE PEAK or Average during event
-                            # For simplicity, we use the current 'features' dictionary values 
-                            # (which is the Offset frame, might be low).
-                            # Better: Store the peak feature vector in active_events.
-                            # For now, let's just use the current feature vector since micro-exp is fast.
-                            # Note: The model was trained on RAW features from CSV. 
-                            # Our 'features' are normalized ratios. 
-                            # The CSV values are around 0-5. Our values are around 0.2-0.5?
-                            # WAIT. The CSV data analysis showed Mean ~2.5. 
-                            # Our FeatureExtractor returns distance/iod. This is usually < 1.0.
-                            # ISSUE: Domain Shift. The Random Forest is trained on CSV values (likely different normalization or mm).
-                            # SCALING FIX: We can retrain model on OUR data (impossible now)
-                            # OR we trust the RF to learn patterns if trends are similar?
-                            # OR we re-scale our inputs to match CSV mean?
-                            # CSV Mean ~2.5. Our Mean ~0.5. Scale Factor ~5.0.
-                            # Let's try scaling by 5.0 to align ranges roughly.
-                            
-                            vec = [
-                                features["AU01"] * 5.0,
-                                features["AU04"] * 5.0,
-                                features["AU06"] * 5.0,
-                                features["AU12"] * 5.0,
-                                features["AU15"] * 5.0
-                            ]
-                            try:
-                                pred = self.model.predict([vec])[0]
-                                emotion = pred
-                            except:
-                                pass
-                                
-                        evt = MicroEvent(start, timestamp, au, peak, duration, emotion)
-                        self.event_log.append(evt)
-                        detected.append(evt)
-                    
-                    del self.active_events[au]
-                    
+                    self.sink.write(evt)
+            detected.append((s, evt))
+            
         return detected
 
-    def _compute_baseline(self):
-        print("[System] Calibration Complete. Monitoring...")
-        for au, buf in self.baseline_buffers.items():
-            self.baseline_stats[au] = {
-                "mean": np.mean(buf),
-                "std": np.std(buf)
-            }
-        self.calibration_done = True
+    def poll(self):
+        """
+        Moves classified events to the sink and flushes it when due (see
+        EventSink.poll). update() does this; call it on frames without a
+        face too, so the sink keeps flushing while nobody is in view.
+        """
+        if self.sink is not None and self.sink.backlog:
+            if self.sink.backlog >= self.sink.flush_every:
+                # Bound the memory held back by unclassified events
+                self.classifier.flush()
+            self.sink.poll()
+
+    def reset_stream(self, stream):
+        """
+        Evicts a slot's calibration, baseline and open events.
+        Returns the slot's event log (the slot starts a new, empty one).
+        """
+        from event_store import EventStore
+        self.baseline.reset(stream)
+        self.core.reset(stream)
+        if self.smoother is not None:
+            self.smoother.reset(stream)
+        log, self.event_logs[stream] = self.event_logs[stream], EventStore()
+        return log
+
+    def flush(self):
+        """
+        Classifies every queued event (see EmotionClassifier.flush).
+        """
+        n = self.classifier.flush()
+        if self.sink is not None:
+            self.sink.poll()
+        return n
+
+    def close(self):
+        """
+        Classifies any queued events and stops the background worker.
+        Closes the sink, if any.
+        """
+        self.classifier.close()
+        if self.sink is not None:
+            self.sink.close()
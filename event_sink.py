@@ -0,0 +1,119 @@
+import os
+import json
+import time
+from collections import deque
+
+from detector import MicroEvent
+
+class EventSink:
+    """
+    Append-only, crash-safe event log (one JSON object per line).
+
+    Events are written in the order they close. Events whose emotion label
+    is still "pending" (deferred/background classification) are held back,
+    together with everything after them, until they are classified, so the
+    file only ever holds final records in close order. Lines are written
+    in batches: every flush_every events or flush_interval seconds,
+    whichever comes first. fsync=True also syncs each batch to disk.
+    Memory use is bounded by the batch size, not the session length.
+    An existing log is appended to; start_offset is where this session's
+    events begin (pass it to read_events to skip earlier sessions).
+    """
+    def __init__(self, path, flush_every=64, flush_interval=1.0, fsync=False):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.count = 0 # events written to disk
+
+        # Held back: waiting for classification (and order)
+        self._pending = deque()
+        # Final lines not written yet
+        self._lines = []
+        self._last_flush = time.monotonic()
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() and not _ends_with_newline(path):
+            # Earlier session crashed mid-line: keep that line separate
+            self._file.write("\n")
+            self._file.flush()
+        self.start_offset = self._file.tell()
+
+    @property
+    def backlog(self):
+        return len(self._pending) + len(self._lines)
+
+    def write(self, evt, **extra):
+        """
+        Queues one closed MicroEvent. Extra keyword fields (e.g. stream=2)
+        are stored with it.
+        """
+        self._pending.append((evt, extra))
+        self.poll()
+
+    def poll(self):
+        """
+        Moves classified events to the write batch and flushes the batch
+        when it is full or old enough. Cheap enough to call every frame.
+        """
+        pending = self._pending
+        while pending and pending[0][0].emotion_label != "pending":
+            self._lines.append(_to_line(*pending.popleft()))
+
+        if self._lines and (len(self._lines) >= self.flush_every or
+                            time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            self._file.write("".join(self._lines))
+            self.count += len(self._lines)
+            self._lines = []
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """
+        Writes everything still held back (labels as they are) and closes
+        the file.
+        """
+        if self._file.closed: return
+        for evt, extra in self._pending:
+            self._lines.append(_to_line(evt, extra))
+        self._pending.clear()
+        self.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+_EVENT_FIELDS = ("start_time", "end_time", "au_type", "intensity_z", "duration", "emotion_label")
+
+def _to_line(evt, extra):
+    # MicroEvent or event_store.EventRecord
+    record = {k: getattr(evt, k) for k in _EVENT_FIELDS}
+    record.update(extra)
+    return json.dumps(record) + "\n"
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+def read_events(path, offset=0):
+    """
+    Yields MicroEvents from an event log, one line at a time, in the
+    order they were written, starting at byte offset (EventSink.start_offset
+    for one session). A truncated line (crash mid-write) is skipped.
+    """
+    with open(path, encoding="utf-8") as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                record = json.loads(line)
+                yield MicroEvent(*(record[k] for k in _EVENT_FIELDS))
+            except:
+                continue
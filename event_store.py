@@ -0,0 +1,173 @@
+import threading
+import numpy as np
+
+from feature_extraction import AU_KEYS
+from detector import MicroEvent
+
+# One row per event (27 bytes). duration is end_time - start_time;
+# emotion is a code into EventStore.labels.
+EVENT_DTYPE = np.dtype([
+    ("start_time", np.float64),
+    ("end_time", np.float64),
+    ("au", np.uint8),
+    ("intensity_z", np.float64),
+    ("emotion", np.int16)
+])
+
+# Report histogram bins (right-open)
+DURATION_BINS = [0.0, 0.2, 0.35, 0.5, 0.75, np.inf]
+INTENSITY_BINS = [0.0, 3.0, 4.0, 6.0, np.inf]
+
+class EventRecord:
+    """
+    Slotted view of one event in an EventStore, with the same attributes
+    as MicroEvent. Setting emotion_label writes through to the store.
+    """
+    __slots__ = ("_store", "_i")
+
+    def __init__(self, store, i):
+        self._store = store
+        self._i = i
+
+    @property
+    def start_time(self): return float(self._store._data["start_time"][self._i])
+    @property
+    def end_time(self): return float(self._store._data["end_time"][self._i])
+    @property
+    def duration(self):
+        row = self._store._data[self._i]
+        return float(row["end_time"] - row["start_time"])
+    @property
+    def au_type(self): return AU_KEYS[self._store._data["au"][self._i]]
+    @property
+    def intensity_z(self): return float(self._store._data["intensity_z"][self._i])
+
+    @property
+    def emotion_label(self):
+        return self._store.labels[self._store._data["emotion"][self._i]]
+    @emotion_label.setter
+    def emotion_label(self, label):
+        self._store.set_label(self._i, label)
+
+    def to_event(self):
+        return MicroEvent(self.start_time, self.end_time, self.au_type,
+                          self.intensity_z, self.duration, self.emotion_label)
+
+    def __repr__(self):
+        return f"EventRecord({self.start_time:.2f}s, {self.au_type}, z={self.intensity_z:.2f}, {self.emotion_label})"
+
+class EventStore:
+    """
+    Columnar event log: one NumPy structured array (EVENT_DTYPE) that
+    grows by doubling, plus a small table of emotion labels.
+    Behaves like a list of events (len, indexing, iteration, append)
+    returning EventRecord views. Labels may be set from another thread
+    (background classification) while events are added.
+    """
+    def __init__(self, capacity=1024):
+        self._data = np.zeros(capacity, dtype=EVENT_DTYPE)
+        self._n = 0
+        self.labels = ["unknown"]
+        self._codes = {"unknown": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_events(cls, events):
+        store = cls(max(len(events), 16))
+        for e in events:
+            store.append(e)
+        return store
+
+    def _code(self, label):
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def add(self, start_time, end_time, au, intensity_z, emotion_label="unknown"):
+        """
+        Appends one event (au: index into AU_KEYS) and returns its record.
+        """
+        with self._lock:
+            if self._n == len(self._data):
+                grown = np.zeros(2 * len(self._data), dtype=EVENT_DTYPE)
+                grown[:self._n] = self._data
+                self._data = grown
+            i = self._n
+            self._data[i] = (start_time, end_time, au, intensity_z, self._code(emotion_label))
+            self._n += 1
+        return EventRecord(self, i)
+
+    def append(self, evt):
+        return self.add(evt.start_time, evt.end_time, AU_KEYS.index(evt.au_type),
+                        evt.intensity_z, evt.emotion_label)
+
+    def extend(self, events):
+        for e in events:
+            self.append(e)
+
+    def set_label(self, i, label):
+        with self._lock:
+            self._data["emotion"][i] = self._code(label)
+
+    @property
+    def data(self):
+        # Filled rows only (a view; copy before adding more events)
+        return self._data[:self._n]
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        if i < 0: i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError("event index out of range")
+        return EventRecord(self, i)
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield EventRecord(self, i)
+
+    def sorted_rows(self):
+        """
+        (start_time, au_type, intensity_z, duration, emotion_label) tuples
+        in start-time order, built from the columns in one pass (report
+        formatting without per-event attribute access).
+        """
+        data = self.data[np.argsort(self.data["start_time"], kind="stable")]
+        au = np.array(AU_KEYS)[data["au"]]
+        labels = np.array(self.labels)[data["emotion"]]
+        duration = data["end_time"] - data["start_time"]
+        return zip(data["start_time"].tolist(), au.tolist(), data["intensity_z"].tolist(),
+                   duration.tolist(), labels.tolist())
+
+    def summary(self):
+        """
+        Aggregates for the report, all computed on the columns at once:
+        per-AU counts (AU_KEYS order), duration and intensity histograms
+        (DURATION_BINS / INTENSITY_BINS) and counts per emotion label.
+        """
+        data = self.data
+        duration = data["end_time"] - data["start_time"]
+        emotion = np.bincount(data["emotion"], minlength=len(self.labels))
+        return {
+            "events": len(data),
+            "au_counts": np.bincount(data["au"], minlength=len(AU_KEYS)),
+            "duration_hist": np.histogram(duration, DURATION_BINS)[0],
+            "intensity_hist": np.histogram(data["intensity_z"], INTENSITY_BINS)[0],
+            "emotions": {label: int(c) for label, c in zip(self.labels, emotion) if c}
+        }
+
+def merge_summaries(a, b):
+    if a is None: return b
+    emotions = dict(a["emotions"])
+    for label, c in b["emotions"].items():
+        emotions[label] = emotions.get(label, 0) + c
+    return {
+        "events": a["events"] + b["events"],
+        "au_counts": a["au_counts"] + b["au_counts"],
+        "duration_hist": a["duration_hist"] + b["duration_hist"],
+        "intensity_hist": a["intensity_hist"] + b["intensity_hist"],
+        "emotions": emotions
+    }
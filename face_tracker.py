@@ -0,0 +1,134 @@
+import numpy as np
+
+from feature_extraction import FeatureExtractor
+from detector import MultiStreamDetector
+
+class FaceTracker:
+    """
+    Keeps a stable identity per face across frames.
+    
+    Detections are matched to existing tracks by face-centre distance,
+    measured in inter-ocular distances (IOD) so it works at any face size.
+    Each track owns one slot (0..max_faces-1) of the multi-stream detector;
+    a track unseen for more than max_missed frames is evicted and its slot
+    freed.
+    """
+    def __init__(self, max_faces, max_missed=15, match_distance=1.0):
+        self.max_faces = max_faces
+        self.max_missed = max_missed
+        self.match_distance = match_distance
+        
+        self.subject_id = np.full(max_faces, -1) # -1 = free slot
+        self.centre = np.zeros((max_faces, 2))
+        self.iod = np.ones(max_faces)
+        self.missed = np.zeros(max_faces, dtype=np.int64)
+        self._next_id = 1
+
+    def assign(self, centres, iods):
+        """
+        centres: (faces, 2) pixel face centres, iods: (faces,).
+        Returns (slot per face (-1 if no free slot), evicted [(slot, subject_id)]).
+        """
+        n = len(centres)
+        slots = np.full(n, -1)
+        used = self.subject_id >= 0
+        
+        if n and used.any():
+            # Greedy matching on the (tracks x faces) distance matrix
+            track_idx = np.nonzero(used)[0]
+            d = np.linalg.norm(self.centre[track_idx, None] - centres[None], axis=2)
+            d /= self.iod[track_idx, None]
+            order = np.argsort(d, axis=None)
+            taken_t = np.zeros(len(track_idx), dtype=bool)
+            for flat in order:
+                t, f = divmod(int(flat), n)
+                if d[t, f] > self.match_distance: break
+                if taken_t[t] or slots[f] >= 0: continue
+                taken_t[t] = True
+                slots[f] = track_idx[t]
+                
+        # New tracks for unmatched faces
+        for f in np.nonzero(slots < 0)[0]:
+            free = np.nonzero(self.subject_id < 0)[0]
+            if not len(free): break
+            s = free[0]
+            self.subject_id[s] = self._next_id
+            self._next_id += 1
+            slots[f] = s
+            
+        seen = np.zeros(self.max_faces, dtype=bool)
+        matched = slots >= 0
+        seen[slots[matched]] = True
+        self.centre[slots[matched]] = centres[matched]
+        self.iod[slots[matched]] = np.where(iods[matched] > 0, iods[matched], 1.0)
+        
+        # Age out lost tracks
+        self.missed[seen] = 0
+        self.missed[~seen & (self.subject_id >= 0)] += 1
+        evicted = []
+        for s in np.nonzero(self.missed > self.max_missed)[0]:
+            evicted.append((int(s), int(self.subject_id[s])))
+            self.subject_id[s] = -1
+            self.missed[s] = 0
+            
+        return slots, evicted
+
+class MultiFaceSession:
+    """
+    Multi-subject observation: tracks every face in the frame and runs
+    feature extraction and event detection for all of them in one batched
+    pass per frame. Event logs are kept per subject (including subjects
+    whose track was lost).
+    """
+    def __init__(self, max_faces=4, max_missed=15, **detector_kwargs):
+        self.max_faces = max_faces
+        self.extractor = FeatureExtractor()
+        self.tracker = FaceTracker(max_faces, max_missed=max_missed)
+        self.detector = MultiStreamDetector(max_faces, **detector_kwargs)
+        self.subject_logs = {}
+        self._points = np.empty((max_faces, len(self.extractor.landmark_idx), 2))
+        self._X = np.full((max_faces, 5), np.nan)
+
+    def process(self, faces, image_w, image_h, timestamp):
+        """
+        faces: list of landmark lists (e.g. results.multi_face_landmarks[i].landmark).
+        Returns the closed events as a list of (subject_id, MicroEvent).
+        """
+        faces = faces[:self.max_faces]
+        n = len(faces)
+        pts = self.extractor.gather(faces, image_w, image_h, out=self._points[:n])
+        feats, iods = self.extractor.extract_gathered(pts)
+        
+        slots, evicted = self.tracker.assign(pts.mean(axis=1), iods)
+        for s, sid in evicted:
+            self._keep_log(sid, self.detector.reset_stream(s))
+            
+        X = self._X
+        X[:] = np.nan
+        ok = slots >= 0
+        X[slots[ok]] = feats[ok]
+        
+        detected = self.detector.update(X, timestamp)
+        return [(int(self.tracker.subject_id[s]), evt) for s, evt in detected]
+
+    def calibrated_subjects(self):
+        return [int(sid) for sid, cal in zip(self.tracker.subject_id, self.detector.calibrated)
+                if sid >= 0 and cal]
+
+    def close(self):
+        """
+        Classifies queued events and returns {subject_id: event log}
+        for every subject seen in the session.
+        """
+        self.detector.close()
+        for s, sid in enumerate(self.tracker.subject_id):
+            if sid >= 0:
+                self._keep_log(int(sid), self.detector.reset_stream(s))
+        return dict(sorted(self.subject_logs.items()))
+
+    def _keep_log(self, sid, log):
+        # Event logs are event_store.EventStores, one per subject
+        if sid in self.subject_logs:
+            self.subject_logs[sid].extend(log)
+        else:
+            self.subject_logs[sid] = log
@@ -1,5 +1,8 @@
 import numpy as np
-import mediapipe as mp
+import time
+
+# Feature vector order used by the array-based APIs
+AU_KEYS = ["AU01", "AU04", "AU06", "AU12", "AU15"]
 
 class FeatureExtractor:
     """
@@ -53,62 +56,133 @@ class FeatureExtractor:
         self.IDX_MOUTH_CENTER_LOW = 17
         self.IDX_CHIN = 152
 
+        # Vectorized path: only the landmarks above are gathered (into a small
+        # preallocated buffer) and every distance is computed in one pass.
+        # Pair 0 is the IOD reference; the rest feed the AU ratios.
+        pairs = [
+            (self.IDX_LEFT_EYE_OUTER, self.IDX_RIGHT_EYE_OUTER),
+            (self.IDX_BROW_INNER_L, self.IDX_EYE_INNER_L),    # AU01
+            (self.IDX_BROW_INNER_R, self.IDX_EYE_INNER_R),    # AU01
+            (self.IDX_BROW_INNER_L, self.IDX_BROW_INNER_R),   # AU04
+            (self.IDX_CHEEK_L, self.IDX_EYE_BOTTOM_L),        # AU06
+            (self.IDX_CHEEK_R, self.IDX_EYE_BOTTOM_R),        # AU06
+            (self.IDX_MOUTH_L, self.IDX_MOUTH_R),             # AU12
+            (self.IDX_MOUTH_L, self.IDX_CHIN),                # AU15
+            (self.IDX_MOUTH_R, self.IDX_CHIN),                # AU15
+        ]
+        # AU = weighted sum of pair distances (averages for the L/R pairs).
+        pair_to_au = [None, 0, 0, 1, 2, 2, 3, 4, 4]
+        
+        self.landmark_idx = sorted({i for pair in pairs for i in pair})
+        pos = {idx: j for j, idx in enumerate(self.landmark_idx)}
+        self._pair_a = np.array([pos[a] for a, _ in pairs])
+        self._pair_b = np.array([pos[b] for _, b in pairs])
+        
+        self._au_weights = np.zeros((len(pairs) - 1, len(AU_KEYS)))
+        for p, au in enumerate(pair_to_au[1:]):
+            self._au_weights[p, au] = 1.0
+        self._au_weights /= self._au_weights.sum(axis=0)
+        
+        # Per-frame scratch buffers (reused, no allocations in extract_vector)
+        self._points = np.empty((len(self.landmark_idx), 2))
+        self._pa = np.empty((len(pairs), 2))
+        self._pb = np.empty((len(pairs), 2))
+        self._dist = np.empty(len(pairs))
+        self._au = np.empty(len(AU_KEYS))
+        
+        # Optional instrumentation.Metrics (None = no timing overhead)
+        self.metrics = None
+
     def extract(self, landmarks, image_w, image_h):
         """
         Input: list of NormalizedLandmark (x, y, z).
         Output: dict of raw feature values.
         """
-        points = np.array([(lm.x * image_w, lm.y * image_h) for lm in landmarks])
+        vec = self.extract_vector(landmarks, image_w, image_h)
+        if vec is None: return None
         
-        # 1. Scale Factor (IOD)
-        iod = np.linalg.norm(points[self.IDX_LEFT_EYE_OUTER] - points[self.IDX_RIGHT_EYE_OUTER])
+        # AU01: Raise > High | AU04: Frown > Low | AU06: Squint > Low
+        # AU12: Smile > High | AU15: Depress > Low
+        return dict(zip(AU_KEYS, vec.tolist()))
+
+    def extract_vector(self, landmarks, image_w, image_h):
+        """
+        Same features as extract(), as an array ordered like AU_KEYS.
+        Only the needed landmarks are read. The returned array is an internal
+        buffer that is overwritten by the next call; copy it to keep it.
+        """
+        if self.metrics is None:
+            return self._extract_vector(landmarks, image_w, image_h)
+        t0 = time.perf_counter()
+        vec = self._extract_vector(landmarks, image_w, image_h)
+        self.metrics.record("extract", time.perf_counter() - t0)
+        return vec
+
+    def _extract_vector(self, landmarks, image_w, image_h):
+        pts = self._points
+        for j, idx in enumerate(self.landmark_idx):
+            lm = landmarks[idx]
+            pts[j, 0] = lm.x * image_w
+            pts[j, 1] = lm.y * image_h
+        
+        # All pair distances in one pass
+        np.take(pts, self._pair_a, axis=0, out=self._pa)
+        np.take(pts, self._pair_b, axis=0, out=self._pb)
+        np.subtract(self._pa, self._pb, out=self._pa)
+        np.multiply(self._pa, self._pa, out=self._pa)
+        np.sum(self._pa, axis=1, out=self._dist)
+        np.sqrt(self._dist, out=self._dist)
+        
+        iod = self._dist[0]
         if iod == 0: return None
         
-        # Helper Dist
-        def dist(i1, i2):
-            return np.linalg.norm(points[i1] - points[i2])
-            
-        def dist_y(i1, i2):
-            return abs(points[i1][1] - points[i2][1])
-            
-        # 2. Features
-        
-        # AU01 Proxy: Brow Inner Height (Larger = Raise)
-        brow_l = dist(self.IDX_BROW_INNER_L, self.IDX_EYE_INNER_L)
-        brow_r = dist(self.IDX_BROW_INNER_R, self.IDX_EYE_INNER_R)
-        au01_raw = (brow_l + brow_r) / (2 * iod)
-        
-        # AU04 Proxy: Inter-Brow Dist (Smaller = Frown/Squeeze) 
-        # Note: We negate it so "Higher Value" = "More Action" to match ML convention?
-        # Or we keep it raw. Let's keep raw density.
-        # Startle/Frown often generally squeezes face.
-        inter_brow = dist(self.IDX_BROW_INNER_L, self.IDX_BROW_INNER_R)
-        au04_raw = inter_brow / iod 
-        # Note: AU04 triggers when this DECREASES.
-        
-        # AU06 Proxy: Cheek-Eye Compresion (Smaller = Squint)
-        cheek_l = dist(self.IDX_CHEEK_L, self.IDX_EYE_BOTTOM_L)
-        cheek_r = dist(self.IDX_CHEEK_R, self.IDX_EYE_BOTTOM_R)
-        au06_raw = (cheek_l + cheek_r) / (2 * iod)
-        # AU06 triggers when this DECREASES (cheek goes up).
-        
-        # AU12 Proxy: Mouth Width (Larger = Smile)
-        mouth_width = dist(self.IDX_MOUTH_L, self.IDX_MOUTH_R)
-        au12_raw = mouth_width / iod
-        # AU12 triggers when this INCREASES.
-        
-        # AU15 Proxy: Mouth Corner Drop
-        # Dist from Corner to Chin (Smaller = Dropped/Sad?) 
-        # Actually corner moves DOWN, so closer to chin.
-        corner_chin_l = dist(self.IDX_MOUTH_L, self.IDX_CHIN)
-        corner_chin_r = dist(self.IDX_MOUTH_R, self.IDX_CHIN)
-        au15_raw = (corner_chin_l + corner_chin_r) / (2 * iod)
-        # AU15 triggers when this DECREASES (corners go down/closer to chin).
-        
-        return {
-            "AU01": au01_raw, # Raise > High
-            "AU04": au04_raw, # Frown > Low
-            "AU06": au06_raw, # Squint > Low
-            "AU12": au12_raw, # Smile > High
-            "AU15": au15_raw  # Depress > Low
-        }
+        np.dot(self._dist[1:], self._au_weights, out=self._au)
+        self._au /= iod
+        return self._au
+
+    def extract_batch(self, points, image_w=1.0, image_h=1.0):
+        """
+        Input: array of shape (frames, landmarks, 2) (or (landmarks, 2)),
+        in normalized coordinates scaled by image_w/image_h, or in pixels
+        with the defaults. Extra trailing coords (e.g. z) are ignored.
+        Output: array of shape (frames, 5) ordered like AU_KEYS.
+        Frames with a degenerate face (IOD == 0) are NaN.
+        """
+        points = np.asarray(points)
+        single = points.ndim == 2
+        if single: points = points[None]
+        
+        sub = points[:, self.landmark_idx, :2] * (image_w, image_h)
+        au, iod = self.extract_gathered(sub)
+        
+        return au[0] if single else au
+
+    def gather(self, faces, image_w, image_h, out=None):
+        """
+        Input: list of landmark lists (one per face).
+        Output: array of shape (faces, len(landmark_idx), 2) in pixels,
+        holding only the landmarks the features need.
+        """
+        if out is None:
+            out = np.empty((len(faces), len(self.landmark_idx), 2))
+        for f, landmarks in enumerate(faces):
+            for j, idx in enumerate(self.landmark_idx):
+                lm = landmarks[idx]
+                out[f, j, 0] = lm.x * image_w
+                out[f, j, 1] = lm.y * image_h
+        return out
+
+    def extract_gathered(self, sub):
+        """
+        Features from gathered points (see gather()), shape (faces, K, 2).
+        Returns (features (faces, 5), IOD (faces,)); degenerate faces are NaN.
+        """
+        diff = sub[:, self._pair_a] - sub[:, self._pair_b]
+        dist = np.sqrt(np.einsum("fpk,fpk->fp", diff, diff))
+        
+        iod = dist[:, 0:1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            au = (dist[:, 1:] @ self._au_weights) / iod
+        au[iod[:, 0] == 0] = np.nan
+        
+        return au, iod[:, 0]
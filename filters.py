@@ -0,0 +1,135 @@
+import numpy as np
+
+# Smoothing of the raw AU ratios before baseline and Z-scoring.
+# Every filter works on (streams, AUs) arrays with O(1) state per AU and
+# the same interface: update(X, timestamps, mask) returns the filtered
+# frame (an internal buffer, overwritten by the next call), reset(streams)
+# restarts the given streams. Masked-out streams keep their state and
+# output. The first frame of a stream passes through unchanged.
+
+class EmaFilter:
+    """
+    Exponential moving average: y += alpha * (x - y).
+    Cheapest filter; lags every change by about (1 - alpha) / alpha frames.
+    """
+    def __init__(self, n_streams, n_aus, alpha=0.5):
+        self.alpha = alpha
+        self.y = np.zeros((n_streams, n_aus))
+        self.started = np.zeros(n_streams, dtype=bool)
+
+    def update(self, X, timestamps=None, mask=None):
+        upd = np.ones(len(self.y), dtype=bool) if mask is None else np.asarray(mask)
+        first = upd & ~self.started
+        np.copyto(self.y, X, where=first[:, None])
+        step = (upd & self.started)[:, None]
+        np.add(self.y, self.alpha * (X - self.y), out=self.y, where=step)
+        self.started |= upd
+        return self.y
+
+    def reset(self, streams):
+        self.started[streams] = False
+
+class OneEuroFilter:
+    """
+    One Euro filter (Casiez et al., 2012): a low-pass whose cutoff rises
+    with the signal's speed, so jitter at rest is smoothed strongly while
+    fast onsets pass with little lag.
+
+    min_cutoff (Hz) sets the smoothing at rest, beta how fast the cutoff
+    grows with speed (AU ratio units per second), d_cutoff (Hz) smooths
+    the speed estimate. Uses the frame timestamps (seconds).
+    """
+    def __init__(self, n_streams, n_aus, min_cutoff=2.0, beta=20.0, d_cutoff=1.0, fps=30.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.default_dt = 1.0 / fps
+        self.x = np.zeros((n_streams, n_aus))
+        self.dx = np.zeros((n_streams, n_aus))
+        self.t = np.zeros(n_streams)
+        self.started = np.zeros(n_streams, dtype=bool)
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def update(self, X, timestamps, mask=None):
+        upd = np.ones(len(self.x), dtype=bool) if mask is None else np.asarray(mask)
+        ts = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), self.t.shape)
+
+        dt = ts - self.t
+        dt = np.where(dt > 0, dt, self.default_dt)[:, None]
+        step = (upd & self.started)[:, None]
+
+        # Smoothed speed, then a cutoff that follows it
+        dx = (X - self.x) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        np.add(self.dx, a_d * (dx - self.dx), out=self.dx, where=step)
+        a = self._alpha(self.min_cutoff + self.beta * np.abs(self.dx), dt)
+        np.add(self.x, a * (X - self.x), out=self.x, where=step)
+
+        first = (upd & ~self.started)[:, None]
+        np.copyto(self.x, X, where=first)
+        np.copyto(self.dx, 0.0, where=first)
+        np.copyto(self.t, ts, where=upd)
+        self.started |= upd
+        return self.x
+
+    def reset(self, streams):
+        self.started[streams] = False
+
+class SavGolFilter:
+    """
+    Causal Savitzky-Golay filter: fits a polynomial of `order` to the last
+    `window` frames (a ring buffer) and evaluates it at the newest frame.
+    Keeps peak height better than an EMA of similar smoothing. Until the
+    window has filled, frames pass through unchanged. The defaults (a line
+    over 0.5s at 30 FPS) were tuned with soak.py; order 2 follows jitter
+    too closely at these window sizes and adds events.
+    """
+    def __init__(self, n_streams, n_aus, window=15, order=1):
+        if order >= window:
+            raise ValueError("Savitzky-Golay order must be smaller than the window")
+        self.window = window
+        # Least-squares fit on t = -(window-1)..0, value at t = 0;
+        # coefficients ordered oldest to newest
+        t = np.arange(-(window - 1), 1, dtype=np.float64)
+        A = np.vander(t, order + 1, increasing=True)
+        self.coef = np.linalg.pinv(A)[0]
+
+        self.buffer = np.zeros((n_streams, window, n_aus))
+        self.count = np.zeros(n_streams, dtype=np.int64)
+        self.y = np.zeros((n_streams, n_aus))
+        self._order = np.arange(window)
+
+    def update(self, X, timestamps=None, mask=None):
+        rows = np.arange(len(self.count)) if mask is None else np.nonzero(mask)[0]
+        if len(rows) == 0:
+            return self.y
+        self.buffer[rows, self.count[rows] % self.window] = X[rows]
+        self.count[rows] += 1
+
+        # Ring positions oldest -> newest for each updated stream
+        idx = (self.count[rows, None] + self._order) % self.window
+        window = self.buffer[rows[:, None], idx]
+        smooth = np.einsum("k,skj->sj", self.coef, window)
+        full = self.count[rows] >= self.window
+        self.y[rows] = np.where(full[:, None], smooth, X[rows])
+        return self.y
+
+    def reset(self, streams):
+        self.count[streams] = 0
+
+FILTERS = {"ema": EmaFilter, "one_euro": OneEuroFilter, "savgol": SavGolFilter}
+
+def make_filter(mode, n_streams, n_aus, **params):
+    """
+    Filter for mode 'ema', 'one_euro' or 'savgol' (params go to its
+    constructor), or None for 'none'.
+    """
+    if mode in (None, "none"):
+        return None
+    if mode not in FILTERS:
+        raise ValueError(f"Unknown smoothing mode: {mode}")
+    return FILTERS[mode](n_streams, n_aus, **params)
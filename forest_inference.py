@@ -0,0 +1,227 @@
+import threading
+import numpy as np
+
+# Max abs probability difference to the sklearn model for an export
+PARITY_TOL = 1e-6
+
+class FlatForest:
+    """
+    Random forest flattened into NumPy arrays for fast inference.
+    
+    All trees are concatenated into one node table (feature, threshold,
+    left, right, value). Leaves point to themselves, so every row/tree pair
+    can be walked in lockstep for max_depth steps with no branching.
+    Scratch buffers are reused between calls of the same batch size and
+    are per thread, so one loaded instance can be shared process-wide.
+    
+    Predictions match RandomForestClassifier.predict / predict_proba
+    (the sklearn model stays the reference implementation).
+    feature_scale_ is the runtime feature scaling the model was trained
+    for (None if it was not saved with the model).
+    """
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth, n_features,
+                 feature_scale=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.classes_ = np.asarray(classes)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.feature_scale_ = None if feature_scale is None else float(feature_scale)
+        self._local = threading.local()
+
+    @classmethod
+    def from_sklearn(cls, clf):
+        """
+        Builds a FlatForest from a fitted RandomForestClassifier.
+        """
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        
+        for est in clf.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            node_ids = np.arange(n)
+            is_leaf = tree.children_left < 0
+            
+            # Leaves loop back on themselves (feature 0 is read but ignored)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            
+            # Per-node class distribution (older sklearn stores counts)
+            val = tree.value[:, 0, :]
+            values.append(val / val.sum(axis=1, keepdims=True))
+            
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+            
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds),
+            np.concatenate(lefts), np.concatenate(rights),
+            np.concatenate(values), np.array(roots),
+            clf.classes_, max_depth, clf.n_features_in_,
+            getattr(clf, "feature_scale_", None)
+        )
+
+    def save(self, path):
+        extra = {}
+        if self.feature_scale_ is not None:
+            extra["feature_scale"] = np.array(self.feature_scale_)
+        np.savez_compressed(
+            path,
+            feature=self.feature.astype(np.int32),
+            threshold=self.threshold,
+            left=self.left.astype(np.int32),
+            right=self.right.astype(np.int32),
+            value=self.value.astype(np.float32),
+            roots=self.roots.astype(np.int32),
+            classes=self.classes_.astype(str),
+            max_depth=np.array(self.max_depth),
+            n_features=np.array(self.n_features),
+            **extra
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["feature"], data["threshold"], data["left"], data["right"],
+                data["value"], data["roots"], data["classes"], data["max_depth"],
+                data["n_features"],
+                data["feature_scale"] if "feature_scale" in data.files else None
+            )
+
+    def _buffers(self, n):
+        scratch = getattr(self._local, "scratch", None)
+        if scratch is None:
+            scratch = self._local.scratch = {}
+        buf = scratch.get(n)
+        if buf is None:
+            if len(scratch) > 8: scratch.clear()
+            t = len(self.roots)
+            buf = {
+                "nodes": np.empty((n, t), dtype=np.intp),
+                "next": np.empty((n, t), dtype=np.intp),
+                "idx": np.empty((n, t), dtype=np.intp),
+                "x": np.empty((n, t)),
+                "thr": np.empty((n, t)),
+                "left": np.empty((n, t), dtype=bool),
+                "leaf": np.empty((n, t, self.value.shape[1])),
+                "proba": np.empty((n, self.value.shape[1])),
+                "x32": np.empty((n, self.n_features), dtype=np.float32),
+                "x64": np.empty((n, self.n_features)),
+                "label": np.empty(n, dtype=np.intp),
+                "pred": np.empty(n, dtype=self.classes_.dtype),
+                "row_offset": (np.arange(n) * self.n_features)[:, None]
+            }
+            scratch[n] = buf
+        return buf
+
+    def predict_proba(self, X):
+        """
+        X: array-like of shape (n_samples, n_features) or (n_features,).
+        Returns (n_samples, n_classes). The result is an internal buffer
+        that is overwritten by the next call with the same batch size.
+        """
+        X = np.asarray(X)
+        if X.ndim == 1: X = X[None]
+        b = self._buffers(len(X))
+        
+        # sklearn trees compare float32 inputs against float64 thresholds:
+        # round through float32, then widen into the scratch row block
+        if X.dtype == np.float32:
+            np.copyto(b["x64"], X)
+        else:
+            np.copyto(b["x32"], X, casting="unsafe")
+            np.copyto(b["x64"], b["x32"])
+        X = b["x64"].ravel()
+        
+        nodes = b["nodes"]
+        nodes[:] = self.roots
+        
+        for _ in range(self.max_depth):
+            np.take(self.feature, nodes, out=b["idx"])
+            np.add(b["idx"], b["row_offset"], out=b["idx"])
+            np.take(X, b["idx"], out=b["x"])
+            np.take(self.threshold, nodes, out=b["thr"])
+            np.less_equal(b["x"], b["thr"], out=b["left"])
+            np.take(self.left, nodes, out=b["next"])
+            np.take(self.right, nodes, out=nodes)
+            np.copyto(nodes, b["next"], where=b["left"])
+            
+        np.take(self.value, nodes, axis=0, out=b["leaf"])
+        return np.mean(b["leaf"], axis=1, out=b["proba"])
+
+    def predict(self, X):
+        """
+        Class labels for X. Like predict_proba, returns an internal buffer.
+        """
+        proba = self.predict_proba(X)
+        b = self._buffers(len(proba))
+        np.argmax(proba, axis=1, out=b["label"])
+        return np.take(self.classes_, b["label"], out=b["pred"])
+
+def check_parity(clf, forest, X, n_random=1000, seed=0):
+    """
+    Compares FlatForest against the sklearn reference on X plus n_random
+    synthetic rows: uniform over X's feature ranges (widened by 10%),
+    with some values set exactly on split thresholds.
+    Returns (ok, label agreement ratio, max abs probability difference);
+    ok means every label matches and probabilities are within PARITY_TOL.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if n_random and len(X):
+        rng = np.random.default_rng(seed)
+        lo, hi = X.min(axis=0), X.max(axis=0)
+        pad = (hi - lo) * 0.1
+        R = rng.uniform(lo - pad, hi + pad, (n_random, X.shape[1]))
+        # Ties: inputs equal to a split threshold must go left in both
+        split = np.flatnonzero(forest.left != np.arange(len(forest.left)))
+        if len(split):
+            k = rng.choice(split, n_random)
+            R[np.arange(n_random), forest.feature[k]] = forest.threshold[k]
+        X = np.vstack([X, R])
+        
+    ref_labels = clf.predict(X)
+    ref_proba = clf.predict_proba(X)
+    
+    proba = forest.predict_proba(np.asarray(X)).copy()
+    labels = forest.classes_[np.argmax(proba, axis=1)]
+    
+    agreement = float(np.mean(labels == ref_labels))
+    max_diff = float(np.max(np.abs(proba - ref_proba)))
+    return agreement == 1.0 and max_diff <= PARITY_TOL, agreement, max_diff
+
+if __name__ == "__main__":
+    # Convert the existing sklearn model and verify it against dataset.csv
+    import os
+    import sys
+    import pickle
+    from dataset_cache import load_dataset
+    
+    # Model and dataset live next to this module
+    here = os.path.dirname(os.path.abspath(__file__))
+    pkl_path = os.path.join(here, "emotion_model.pkl")
+    if not os.path.exists(pkl_path):
+        print(f"Error: {pkl_path} not found (run model_trainer.py)")
+        sys.exit(1)
+    with open(pkl_path, "rb") as f:
+        clf = pickle.load(f)
+    forest = FlatForest.from_sklearn(clf)
+    
+    X, _ = load_dataset(os.path.join(here, "dataset.csv")).complete()
+    ok, agreement, max_diff = check_parity(clf, forest, X)
+    print(f"Parity: {agreement * 100:.2f}% labels match, max proba diff {max_diff:.2e}")
+    if not ok:
+        print("Error: flat model does not match the sklearn model, not saved")
+        sys.exit(1)
+    
+    forest.save(os.path.join(here, "emotion_model.npz"))
+    print("Flat model saved to emotion_model.npz")
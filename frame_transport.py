@@ -0,0 +1,158 @@
+import threading
+from collections import deque
+from multiprocessing import shared_memory
+import numpy as np
+
+class FrameRing:
+    """
+    Fixed ring of frame slots in shared memory, plus a small shared array
+    for per-slot results, so frames cross process boundaries without being
+    pickled or copied.
+
+    The owner (capture/dispatcher side) acquires a free slot, writes the
+    frame straight into view(slot, shape) (e.g. cap.read(view)), and
+    publish() bumps the slot's sequence number. Workers attach by spec,
+    get the frame as a NumPy view with frame(slot, seq) and write their
+    output with write_result(slot, seq, vec). The owner reads it with
+    read_result(slot, seq) and releases the slot. A slot is only reused
+    after release, and the sequence number guards against reading a
+    stale frame or result: release() bumps it too, so a worker still busy
+    with a slot that was given up (e.g. a timed-out task) drops its
+    result instead of writing over the slot's next one.
+
+    Layout: frames block (n_slots x slot_bytes) and a meta block holding
+    the header (n_slots x [seq, h, w, c], int64) and the results
+    (n_slots x [seq, has_value, values...], float64).
+    """
+    def __init__(self, n_slots, slot_bytes, n_values=5, names=None):
+        self.n_slots = n_slots
+        self.slot_bytes = slot_bytes
+        self.n_values = n_values
+        self.owner = names is None
+
+        header_bytes = n_slots * 4 * 8
+        meta_bytes = header_bytes + n_slots * (2 + n_values) * 8
+        if self.owner:
+            self._frames = shared_memory.SharedMemory(create=True, size=n_slots * slot_bytes)
+            self._meta = shared_memory.SharedMemory(create=True, size=meta_bytes)
+        else:
+            self._frames = shared_memory.SharedMemory(name=names[0])
+            self._meta = shared_memory.SharedMemory(name=names[1])
+
+        self.header = np.ndarray((n_slots, 4), dtype=np.int64, buffer=self._meta.buf)
+        self.results = np.ndarray((n_slots, 2 + n_values), dtype=np.float64,
+                                  buffer=self._meta.buf, offset=header_bytes)
+        if self.owner:
+            self.header[:] = 0
+            self.results[:] = 0
+            self._free = deque(range(n_slots))
+            self._lock = threading.Lock()
+
+    @property
+    def spec(self):
+        """
+        Picklable description for attach() in another process.
+        """
+        return (self.n_slots, self.slot_bytes, self.n_values, (self._frames.name, self._meta.name))
+
+    @classmethod
+    def attach(cls, spec):
+        n_slots, slot_bytes, n_values, names = spec
+        return cls(n_slots, slot_bytes, n_values, names)
+
+    # Owner side
+
+    def acquire(self):
+        """
+        A free slot index, or None when every slot is in use.
+        """
+        with self._lock:
+            return self._free.popleft() if self._free else None
+
+    def release(self, slot):
+        with self._lock:
+            # Invalidates the old frame for any worker still reading it
+            self.header[slot, 0] += 1
+            self._free.append(slot)
+
+    @property
+    def free(self):
+        return len(self._free)
+
+    def view(self, slot, shape, dtype=np.uint8):
+        """
+        Writable array over the slot's memory (shape must fit slot_bytes).
+        """
+        return np.ndarray(shape, dtype=dtype, buffer=self._frames.buf,
+                          offset=slot * self.slot_bytes)
+
+    def publish(self, slot, shape):
+        """
+        Marks the frame written into the slot as ready. Returns its seq.
+        """
+        h, w = shape[:2]
+        c = shape[2] if len(shape) > 2 else 1
+        self.header[slot, 1:] = (h, w, c)
+        self.header[slot, 0] += 1
+        return int(self.header[slot, 0])
+
+    def read_result(self, slot, seq):
+        """
+        The values a worker wrote for (slot, seq), or None (no value, or
+        the worker never wrote this frame's result).
+        """
+        row = self.results[slot]
+        if int(row[0]) != seq or row[1] == 0:
+            return None
+        values = row[2:].copy()
+        # A late writer marks the row invalid first: recheck after copying
+        if int(row[0]) != seq:
+            return None
+        return values
+
+    # Worker side
+
+    def frame(self, slot, seq):
+        """
+        Zero-copy view of a published frame, or None if the slot has moved
+        on to another frame.
+        """
+        seq_now, h, w, c = self.header[slot].tolist()
+        if seq_now != seq:
+            return None
+        shape = (h, w, c) if c > 1 else (h, w)
+        return self.view(slot, shape)
+
+    def write_result(self, slot, seq, values):
+        """
+        Stores the result for (slot, seq). Returns False (nothing written)
+        if the slot was released or reused since.
+        """
+        if int(self.header[slot, 0]) != seq:
+            return False
+        row = self.results[slot]
+        row[0] = -1 # invalid while the values are written
+        if values is None:
+            row[1] = 0
+        else:
+            row[2:] = values
+            row[1] = 1
+        row[0] = seq
+        return True
+
+    def close(self):
+        """
+        Detaches (and, for the owner, frees) the shared memory. Views
+        still held elsewhere keep the mapping alive until they are gone.
+        """
+        self.header = self.results = None
+        for shm in (self._frames, self._meta):
+            try:
+                shm.close()
+            except BufferError:
+                pass
+            if self.owner:
+                try:
+                    shm.unlink()
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,141 @@
+import time
+import threading
+import numpy as np
+
+class LatencyHistogram:
+    """
+    Rolling latency window: the last `window` samples (milliseconds) in a
+    fixed ring buffer, plus lifetime count/mean/max.
+    """
+    def __init__(self, window=1000):
+        self.samples = np.zeros(window)
+        self.window = window
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        
+    def add(self, seconds):
+        ms = seconds * 1000.0
+        self.samples[self.count % self.window] = ms
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms: self.max_ms = ms
+        
+    @property
+    def mean_ms(self):
+        return self.total_ms / self.count if self.count else 0.0
+        
+    def percentiles(self, q=(50, 95, 99)):
+        n = min(self.count, self.window)
+        if n == 0: return [0.0] * len(q)
+        return np.percentile(self.samples[:n], q).tolist()
+
+class Metrics:
+    """
+    Hot-path instrumentation: per-stage rolling latency histograms,
+    dropped-frame counters and effective FPS.
+    
+    Components take an optional `metrics` attribute and only read the
+    clock when it is set, so disabled instrumentation costs one None check.
+    Stages may be recorded from several threads (pipeline mode) while
+    another one draws the overlay: new keys are added under a lock and
+    readers iterate over a snapshot.
+    """
+    def __init__(self, window=1000, fps_window=60):
+        self.window = window
+        self.stages = {}
+        self.dropped = {}
+        self._frame_times = np.zeros(fps_window)
+        self._frames = 0
+        self._overlay = []
+        self._overlay_time = 0.0
+        self._lock = threading.Lock()
+        
+    def record(self, stage, seconds):
+        hist = self.stages.get(stage)
+        if hist is None:
+            with self._lock:
+                hist = self.stages.setdefault(stage, LatencyHistogram(self.window))
+        hist.add(seconds)
+        
+    def drop(self, stage, n=1):
+        with self._lock:
+            self.dropped[stage] = self.dropped.get(stage, 0) + n
+            
+    def _snapshot(self):
+        # (stages, dropped) copies that are safe to iterate
+        with self._lock:
+            return list(self.stages.items()), dict(self.dropped)
+        
+    def frame(self):
+        """
+        Marks one frame as shown/processed (for effective FPS).
+        """
+        self._frame_times[self._frames % len(self._frame_times)] = time.perf_counter()
+        self._frames += 1
+        
+    @property
+    def fps(self):
+        n = min(self._frames, len(self._frame_times))
+        if n < 2: return 0.0
+        last = self._frame_times[(self._frames - 1) % len(self._frame_times)]
+        first = self._frame_times[(self._frames - n) % len(self._frame_times)]
+        return (n - 1) / (last - first) if last > first else 0.0
+        
+    def summary(self):
+        """
+        Plain dict of every stage's p50/p95/p99, drops and FPS.
+        """
+        stages = {}
+        items, dropped = self._snapshot()
+        for name, h in items:
+            p50, p95, p99 = h.percentiles()
+            stages[name] = {"count": h.count, "mean_ms": h.mean_ms, "max_ms": h.max_ms,
+                            "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+        return {"fps": self.fps, "frames": self._frames, "stages": stages,
+                "dropped": dropped}
+        
+    def overlay_lines(self, refresh=0.5):
+        """
+        Short lines for the on-screen overlay, recomputed at most every
+        `refresh` seconds so drawing it stays cheap.
+        """
+        now = time.perf_counter()
+        if self._overlay and now - self._overlay_time < refresh:
+            return self._overlay
+        self._overlay_time = now
+        
+        items, dropped = self._snapshot()
+        lines = [f"FPS {self.fps:5.1f} | dropped {sum(dropped.values())}"]
+        for name, h in items:
+            p50, p95, p99 = h.percentiles()
+            lines.append(f"{name:<9} {p50:5.1f} / {p95:5.1f} / {p99:5.1f} ms")
+        self._overlay = lines
+        return lines
+        
+    def report_lines(self):
+        """
+        Performance section for the session report.
+        """
+        items, dropped = self._snapshot()
+        lines = []
+        lines.append(f"Effective FPS: {self.fps:.1f} ({self._frames} frames)")
+        dropped = ", ".join(f"{k}={v}" for k, v in dropped.items()) or "none"
+        lines.append(f"Dropped Frames: {dropped}")
+        lines.append("")
+        lines.append(f"{'Stage':<12} | {'p50 (ms)':<10} | {'p95 (ms)':<10} | {'p99 (ms)':<10} | {'Max (ms)'}")
+        lines.append("-" * 64)
+        for name, h in items:
+            p50, p95, p99 = h.percentiles()
+            lines.append(f"{name:<12} | {p50:<10.2f} | {p95:<10.2f} | {p99:<10.2f} | {h.max_ms:.2f}")
+        return lines
+
+def draw_overlay(frame, metrics, origin=(20, 60)):
+    """
+    Draws the metrics overlay (FPS, drops, per-stage p50/p95/p99) on a BGR frame.
+    """
+    import cv2
+    x, y = origin
+    for line in metrics.overlay_lines():
+        cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
+        y += 18
@@ -1,44 +1,43 @@
-import cv2
-import mediapipe as mp
 import time
 import os
+import argparse
 from feature_extraction import FeatureExtractor
-from detector import EventDetector
+from detector import EventDetector, preload_model
 from report_generator import ReportGenerator
+from instrumentation import Metrics, draw_overlay
 
-def main():
-    # Setup
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("Error: Webcam not found.")
-        return
-
-    mp_face_mesh = mp.solutions.face_mesh
-    face_mesh = mp_face_mesh.FaceMesh(
-        max_num_faces=1,
-        refine_landmarks=True,
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5
-    )
-    
-    extractor = FeatureExtractor()
-    detector = EventDetector(buffer_duration=3.0) # 3s calibration
-    
-    print("--------------------------------------------------")
-    print("   Micro-Expression Observation System")
-    print("--------------------------------------------------")
-    print("Keep face still for 3 seconds to calibrate.")
-    print("Press 'q' to quit and generate report.")
+def run_loop(cap, face_mesh, extractor, detector, recorder=None, metrics=None, landmarker=None):
+    """
+    Sequential capture -> inference -> render loop on the calling thread.
+    With metrics (instrumentation.Metrics) each stage is timed, frames the
+    camera delivered late are counted as dropped and an overlay is drawn.
+    With landmarker (roi.RoiLandmarker) FaceMesh only sees the face crop.
+    Returns the session duration in seconds.
+    """
+    import cv2
     
     start_time = time.time()
+    current_time = 0.0
+    clock = time.perf_counter
+    frame_interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+    last_capture = None
     
     while True:
+        t0 = clock()
         ret, frame = cap.read()
         if not ret: break
+        t_capture = clock()
         
         h, w, c = frame.shape
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = face_mesh.process(rgb_frame)
+        if landmarker:
+            # Crop, conversion and FaceMesh all timed as 'facemesh'
+            t_convert = t_capture
+            results = landmarker.process(frame)
+        else:
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            t_convert = clock()
+            results = face_mesh.process(rgb_frame)
+        t_mesh = clock()
         
         current_time = time.time() - start_time
         status_text = "Calibrating..."
@@ -50,6 +49,9 @@ def main():
             features = extractor.extract(landmarks, w, h)
             
             if features:
+                if recorder:
+                    recorder.record(current_time, landmarks, w, h, features)
+                    
                 # 2. Detection
                 events = detector.update(features, current_time)
                 
@@ -60,17 +62,187 @@ def main():
                         cv2.putText(frame, "EVENT DETECTED", (50, 100), 
                                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
                         print(f"[{current_time:.2f}s] Event: {events[-1].au_type}")
+        else:
+            # No face: keep the event sink flushing
+            detector.poll()
 
         # UI
+        t_draw = clock()
         color = (0, 255, 255) if not detector.calibration_done else (0, 255, 0)
         cv2.putText(frame, f"Status: {status_text}", (20, 30), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                   
+        if metrics:
+            draw_overlay(frame, metrics)
+            
+        cv2.imshow("Micro-Expression Observer", frame)
+        
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+            
+        if metrics:
+            t_end = clock()
+            metrics.record("capture", t_capture - t0)
+            metrics.record("convert", t_convert - t_capture)
+            metrics.record("facemesh", t_mesh - t_convert)
+            metrics.record("draw", t_end - t_draw)
+            metrics.record("frame", t_end - t0)
+            metrics.frame()
+            
+            # Frames the camera produced while we were busy
+            if last_capture is not None:
+                missed = round((t_capture - last_capture) / frame_interval) - 1
+                if missed > 0: metrics.drop("camera", missed)
+            last_capture = t_capture
+            
+    return current_time
+
+def run_multi_loop(cap, face_mesh, session, metrics=None, recorder=None):
+    """
+    Sequential loop for several subjects: every face in the frame goes
+    through one batched extraction/detection pass (face_tracker.MultiFaceSession).
+    Frames without faces are passed too, so lost subjects are evicted.
+    With recorder, the first face is recorded (as in batch mode).
+    Returns the session duration in seconds.
+    """
+    import cv2
+    
+    start_time = time.time()
+    current_time = 0.0
+    clock = time.perf_counter
+    
+    while True:
+        t0 = clock()
+        ret, frame = cap.read()
+        if not ret: break
+        
+        h, w, c = frame.shape
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results = face_mesh.process(rgb_frame)
+        t_mesh = clock()
+        
+        current_time = time.time() - start_time
+        
+        faces = [f.landmark for f in results.multi_face_landmarks] if results.multi_face_landmarks else []
+        events = session.process(faces, w, h, current_time)
+        if recorder and faces:
+            features = session.extractor.extract(faces[0], w, h)
+            if features:
+                recorder.record(current_time, faces[0], w, h, features)
+            
+        for subject_id, evt in events:
+            print(f"[{current_time:.2f}s] Subject {subject_id} Event: {evt.au_type}")
+        if events:
+            cv2.putText(frame, "EVENT DETECTED", (50, 100), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                       
+        # UI
+        n_faces = len(results.multi_face_landmarks or [])
+        n_monitored = len(session.calibrated_subjects())
+        cv2.putText(frame, f"Faces: {n_faces} | Monitoring: {n_monitored}", (20, 30), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        if metrics:
+            draw_overlay(frame, metrics)
+            
         cv2.imshow("Micro-Expression Observer", frame)
         
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
             
+        if metrics:
+            metrics.record("facemesh", t_mesh - t0)
+            metrics.record("frame", clock() - t0)
+            metrics.frame()
+            
+    return current_time
+
+def main(pipelined=False, queue_size=2, drop_policy="latest", baseline="static",
+         record=None, record_mode="landmarks", show_metrics=False, max_faces=1,
+         roi=False, roi_size=320, skip_every=0, events=None, smoothing="none", z_exit=None):
+    # Model loads in the background while the camera and FaceMesh start up
+    preload_model("flat")
+    
+    # Heavy imports deferred until needed (fast --help / --batch start)
+    import cv2
+    import mediapipe as mp
+    
+    # Setup
+    cap = cv2.VideoCapture(0)
+    if not cap.isOpened():
+        print("Error: Webcam not found.")
+        return
+
+    mp_face_mesh = mp.solutions.face_mesh
+    face_mesh = mp_face_mesh.FaceMesh(
+        max_num_faces=max_faces,
+        refine_landmarks=True,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+    
+    extractor = FeatureExtractor()
+    session = None
+    detector = None
+    if max_faces > 1:
+        # Per-subject tracking, calibration and event logs
+        from face_tracker import MultiFaceSession
+        session = MultiFaceSession(max_faces, buffer_duration=3.0, classify="background",
+                                   baseline=baseline, smoothing=smoothing, z_exit=z_exit)
+    else:
+        sink = None
+        if events:
+            # Events streamed to disk as they close; no in-memory log
+            from event_sink import EventSink
+            sink = EventSink(events)
+        detector = EventDetector(buffer_duration=3.0, classify="background", baseline=baseline,
+                                 sink=sink, smoothing=smoothing, z_exit=z_exit) # 3s calibration
+    
+    print("--------------------------------------------------")
+    print("   Micro-Expression Observation System")
+    print("--------------------------------------------------")
+    print("Keep face still for 3 seconds to calibrate.")
+    print("Press 'q' to quit and generate report.")
+    
+    # Hot-path instrumentation (off by default: no timing overhead)
+    metrics = None
+    if show_metrics:
+        metrics = Metrics()
+        extractor.metrics = metrics
+        (session.detector if session else detector).metrics = metrics
+        
+    recorder = None
+    if record:
+        from recording import SessionRecorder
+        recorder = SessionRecorder(record, mode=record_mode)
+        
+    if session:
+        current_time = run_multi_loop(cap, face_mesh, session, metrics, recorder)
+    elif pipelined:
+        from pipeline import FramePipeline
+        pipeline = FramePipeline(cap, face_mesh, extractor, detector,
+                                 queue_size=queue_size, drop_policy=drop_policy,
+                                 recorder=recorder, metrics=metrics,
+                                 show_metrics=show_metrics)
+        current_time = pipeline.run()
+        pipeline.print_stats()
+    else:
+        landmarker = None
+        if roi:
+            from roi import RoiLandmarker
+            landmarker = RoiLandmarker(face_mesh, extractor.landmark_idx,
+                                       max_side=roi_size, skip_every=skip_every)
+        current_time = run_loop(cap, face_mesh, extractor, detector, recorder, metrics, landmarker)
+        if landmarker:
+            print(f"[System] ROI mode: {landmarker.full_frame} full-frame searches, "
+                  f"{landmarker.skipped} frames extrapolated")
+        
+    if recorder:
+        recorder.close()
+        
+    if smoothing != "none" or z_exit is not None:
+        counts = (session.detector if session else detector).transition_counts
+        print(f"[System] {counts['opened']} event onsets ({counts['raw_opened'] or counts['opened']} unsmoothed), "
+              f"{counts['held']} dips held open, {counts['too_short']} too short")
+        
     # Cleanup
     cap.release()
     cv2.destroyAllWindows()
@@ -78,7 +250,20 @@ def main():
     # Report
     print("\nGenerating Report...")
     gen = ReportGenerator(style="plain") # Default to plain
-    report = gen.generate(detector.event_log, current_time)
+    if session:
+        report = gen.generate_multi(session.close(), current_time, metrics=metrics)
+    elif detector.sink:
+        detector.close() # classify and write any events still queued
+        # Only this session's events (the log is appended to across runs)
+        gen.write_report(events, "report.txt", current_time, metrics=metrics,
+                         reorder_window=detector.MAX_DURATION,
+                         offset=detector.sink.start_offset)
+        print(f"{detector.sink.count} events logged to {events}")
+        print("\nReport saved to report.txt")
+        return
+    else:
+        detector.close() # classify any events still queued
+        report = gen.generate(detector.event_log, current_time, metrics=metrics)
     
     with open("report.txt", "w") as f:
         f.write(report)
@@ -87,4 +272,67 @@ def main():
     print("\nReport saved to report.txt")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Micro-Expression Observation System")
+    parser.add_argument("--batch", nargs="+", metavar="VIDEO",
+                        help="Analyse recorded video files (or directories) offline instead of the webcam")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Batch worker processes (default: one per core)")
+    parser.add_argument("--output-dir", default="reports",
+                        help="Directory for batch reports")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Run capture, inference and rendering as separate threaded stages")
+    parser.add_argument("--queue-size", type=int, default=2,
+                        help="Bounded queue size between pipeline stages")
+    parser.add_argument("--drop-policy", choices=["latest", "block"], default="latest",
+                        help="'latest' drops stale frames when a stage falls behind; 'block' waits")
+    parser.add_argument("--record", metavar="DIR", default=None,
+                        help="Record per-frame landmarks (or AU features) for replay with recording.py "
+                             "(batch mode: one session per video under DIR)")
+    parser.add_argument("--record-mode", choices=["landmarks", "features"], default="landmarks")
+    parser.add_argument("--max-faces", type=int, default=1,
+                        help="Track up to N subjects with separate baselines and per-subject reports")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Show live latency/FPS metrics and add them to the report")
+    parser.add_argument("--baseline", choices=["static", "welford", "ewma"], default="static",
+                        help="Baseline mode: one-shot calibration, or a running baseline for long sessions")
+    parser.add_argument("--roi", action="store_true",
+                        help="Run FaceMesh on a downscaled crop around the face instead of the full frame")
+    parser.add_argument("--roi-size", type=int, default=320,
+                        help="Longest side (pixels) the face crop is downscaled to in --roi mode")
+    parser.add_argument("--skip-every", type=int, default=0,
+                        help="In --roi mode, skip landmarking on every Nth frame while the face is steady")
+    parser.add_argument("--events", metavar="FILE", default=None,
+                        help="Append events to FILE (JSONL) as they close instead of keeping them in memory; "
+                             "the report is built from it (single subject)")
+    parser.add_argument("--smoothing", choices=["none", "ema", "one_euro", "savgol"], default="none",
+                        help="Smooth the AU features before Z-scoring (fewer spurious events)")
+    parser.add_argument("--z-exit", type=float, default=None,
+                        help="Hysteresis: events open above Z 2.0 and close at or below this Z")
+    args = parser.parse_args()
+    if args.max_faces > 1 and not args.batch:
+        # The multi-subject loop is sequential, full-frame and in-memory
+        for flag, used in (("--pipeline", args.pipeline), ("--roi", args.roi), ("--events", args.events)):
+            if used:
+                parser.error(f"{flag} is not supported with --max-faces > 1")
+    if args.pipeline and args.roi:
+        # The pipeline's inference stage always landmarks the full frame
+        parser.error("--roi is not supported with --pipeline")
+    if args.batch:
+        # Batch workers run the plain sequential loop with in-memory logs
+        for flag, used in (("--pipeline", args.pipeline), ("--roi", args.roi),
+                           ("--events", args.events), ("--metrics", args.metrics)):
+            if used:
+                parser.error(f"{flag} is not supported with --batch")
+    
+    if args.batch:
+        from batch_processor import run_batch
+        run_batch(args.batch, output_dir=args.output_dir, workers=args.workers,
+                  baseline=args.baseline, record_dir=args.record,
+                  record_mode=args.record_mode, max_faces=args.max_faces,
+                  smoothing=args.smoothing, z_exit=args.z_exit)
+    else:
+        main(pipelined=args.pipeline, queue_size=args.queue_size, drop_policy=args.drop_policy,
+             baseline=args.baseline, record=args.record, record_mode=args.record_mode,
+             show_metrics=args.metrics, max_faces=args.max_faces,
+             roi=args.roi, roi_size=args.roi_size, skip_every=args.skip_every,
+             events=args.events, smoothing=args.smoothing, z_exit=args.z_exit)
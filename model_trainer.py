@@ -1,46 +1,250 @@
-import pandas as pd
+import os
+import sys
+import time
+import argparse
+import itertools
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
+from sklearn.model_selection import train_test_split, StratifiedKFold
+from sklearn.metrics import classification_report, accuracy_score
 import pickle
+from forest_inference import FlatForest, check_parity
+from dataset_cache import AU_COLUMNS, DERIVED_PREFIX, load_dataset
+from detector import MODEL_DIR
 
-def train_model():
+# Runtime AU ratios (FeatureExtractor) -> dataset AU units. Saved with the model.
+FEATURE_SCALE = 5.0
+
+# Candidates for --search
+SEARCH_GRID = {
+    "n_estimators": [25, 50, 100],
+    "max_depth": [4, 5, 6, 8],
+    "min_samples_leaf": [1, 5]
+}
+
+def fold_splits(ds, y, n_folds=3, seed=42):
+    """
+    Stratified fold id per row of y, cached in the dataset cache directory
+    so repeated searches (and every candidate) reuse the same splits.
+    """
+    path = None
+    if ds.cache_dir:
+        path = os.path.join(ds.cache_dir, f"{DERIVED_PREFIX}{len(y)}_{n_folds}_{seed}.npy")
+        if os.path.exists(path):
+            return np.load(path)
+
+    folds = np.empty(len(y), dtype=np.int8)
+    skf = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    for k, (_, test_idx) in enumerate(skf.split(np.zeros(len(y)), y)):
+        folds[test_idx] = k
+    if path:
+        np.save(path, folds)
+    return folds
+
+def _fit_fold(params, X, y, folds, k, seed):
+    # Runs in a worker process; one tree-building thread per candidate/fold
+    clf = RandomForestClassifier(random_state=seed, n_jobs=1, **params)
+    train, test = folds != k, folds == k
+    clf.fit(X[train], y[train])
+    acc = accuracy_score(y[test], clf.predict(X[test]))
+    return acc, (clf if k == 0 else None)
+
+def inference_latency(clf, X, n_rows=200):
+    """
+    p50 single-row latency (us) of the flat runtime model built from clf.
+    """
+    forest = FlatForest.from_sklearn(clf)
+    forest.predict(X[:1]) # warm-up (scratch buffers)
+    clock = time.perf_counter_ns
+    samples = []
+    for row in X[:n_rows]:
+        t0 = clock()
+        forest.predict(row[None])
+        samples.append(clock() - t0)
+    return float(np.percentile(samples, 50)) / 1000.0
+
+def search(ds, X, y, grid=SEARCH_GRID, n_folds=3, workers=-1, seed=42):
+    """
+    Cross-validated grid search, every candidate/fold pair fitted in
+    parallel across all cores. Latency is measured afterwards, one model
+    at a time, so it is not skewed by the parallel fits.
+    Returns a list of dicts (params, accuracy, latency_us, frontier).
+    """
+    from joblib import Parallel, delayed
+
+    folds = fold_splits(ds, y, n_folds, seed)
+    keys = list(grid)
+    candidates = [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+    print(f"Searching {len(candidates)} candidates x {n_folds} folds...")
+
+    out = Parallel(n_jobs=workers)(
+        delayed(_fit_fold)(params, X, y, folds, k, seed)
+        for params in candidates for k in range(n_folds))
+
+    results = []
+    for i, params in enumerate(candidates):
+        scores = out[i * n_folds:(i + 1) * n_folds]
+        results.append({
+            "params": params,
+            "accuracy": float(np.mean([acc for acc, _ in scores])),
+            "latency_us": inference_latency(scores[0][1], X)
+        })
+
+    # Speed/accuracy frontier: no other candidate is both faster and more accurate
+    for r in results:
+        r["frontier"] = not any(
+            o["accuracy"] >= r["accuracy"] and o["latency_us"] < r["latency_us"] or
+            o["accuracy"] > r["accuracy"] and o["latency_us"] <= r["latency_us"]
+            for o in results)
+    return results
+
+def print_search(results):
+    print(f"{'Candidate':<48} | {'CV Acc':>7} | {'p50 (us)':>9} | Frontier")
+    print("-" * 80)
+    for r in sorted(results, key=lambda r: r["latency_us"]):
+        name = ", ".join(f"{k}={v}" for k, v in r["params"].items())
+        print(f"{name:<48} | {r['accuracy']:>7.3f} | {r['latency_us']:>9.1f} | {'*' if r['frontier'] else ''}")
+
+def select(results, max_latency_us=None):
+    """
+    Most accurate candidate within the latency budget (fastest if none fits).
+    """
+    fits = [r for r in results if max_latency_us is None or r["latency_us"] <= max_latency_us]
+    if not fits:
+        print(f"[Warning] No candidate under {max_latency_us}us, using the fastest.")
+        return min(results, key=lambda r: r["latency_us"])
+    return max(fits, key=lambda r: (r["accuracy"], -r["latency_us"]))
+
+def train_streaming(ds, train_rows, params, chunk_rows, trees_per_chunk, seed=42):
+    """
+    Out-of-core fit: trees_per_chunk trees are added per chunk of rows read
+    from the memory-mapped cache (warm_start), so only one chunk is in
+    memory at a time. Rows are shuffled into chunks; a chunk missing a
+    class is carried over into the next one (every fit must see all classes).
+    A tail shorter than half a chunk is merged into the last full chunk.
+    """
+    n_classes = len(np.unique(ds.codes[train_rows][ds.codes[train_rows] >= 0]))
+    params = dict(params, n_estimators=0)
+    clf = RandomForestClassifier(warm_start=True, random_state=seed, n_jobs=-1, **params)
+
+    # Short tail: read the last full chunk and the tail as one chunk
+    tail = len(train_rows) % chunk_rows
+    split = len(train_rows)
+    if len(train_rows) > chunk_rows and tail < chunk_rows // 2:
+        split -= tail + chunk_rows
+    chunks = itertools.chain(ds.iter_complete(train_rows[:split], chunk_rows),
+                             ds.iter_complete(train_rows[split:], chunk_rows + tail))
+
+    carry = None
+    for X, y in chunks:
+        if carry is not None:
+            X, y = np.concatenate([carry[0], X]), np.concatenate([carry[1], y])
+        if len(np.unique(y)) < n_classes:
+            carry = (X, y)
+            continue
+        carry = None
+        clf.n_estimators += trees_per_chunk
+        clf.fit(X, y)
+        print(f"  {clf.n_estimators} trees ({len(y)} rows)")
+
+    if carry is not None:
+        clf.n_estimators += trees_per_chunk
+        clf.fit(*carry)
+    return clf
+
+def train_model(do_search=False, chunk_rows=None, trees_per_chunk=10, max_latency_us=None,
+                workers=-1, n_folds=3, search_rows=200000, feature_scale=FEATURE_SCALE):
     print("Loading dataset...")
     try:
-        df = pd.read_csv("dataset.csv")
+        # AU features + label only, from the binary cache after the first run
+        ds = load_dataset(os.path.join(MODEL_DIR, "dataset.csv"))
     except Exception as e:
         print(f"Error: {e}")
-        return
-
-    # Features and Target
-    feature_cols = ['AU01_inner_brow_raise', 'AU04_brow_lower', 'AU06_cheek_raise', 'AU12_lip_corner_pull', 'AU15_lip_corner_depress']
-    target_col = 'emotion_predicted'
-    
-    # Check for missing
-    df = df.dropna(subset=feature_cols + [target_col])
-    
-    X = df[feature_cols]
-    y = df[target_col]
-    
-    print(f"Classes: {y.unique()}")
-    
-    # Train/Test
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    # Model
-    clf = RandomForestClassifier(n_estimators=50, max_depth=5, random_state=42)
-    clf.fit(X_train, y_train)
-    
+        return False
+    if len(ds.columns) != len(AU_COLUMNS):
+        print(f"Error: missing feature columns {sorted(set(AU_COLUMNS) - set(ds.columns))}")
+        return False
+
+    params = {"n_estimators": 50, "max_depth": 5}
+
+    if do_search:
+        # Search on an in-memory sample of the complete rows
+        X, y = ds.complete()
+        if len(y) > search_rows:
+            pick = np.sort(np.random.default_rng(42).choice(len(y), search_rows, replace=False))
+            X, y = X[pick], y[pick]
+        results = search(ds, X, y, n_folds=n_folds, workers=workers)
+        print_search(results)
+        best = select(results, max_latency_us)
+        params = best["params"]
+        print(f"Selected: {params} (CV acc {best['accuracy']:.3f}, p50 {best['latency_us']:.1f}us)")
+
+    if chunk_rows:
+        # Out-of-core: hold out 20% of the rows, stream the rest in chunks
+        order = np.random.default_rng(42).permutation(len(ds))
+        n_test = len(order) // 5
+        test_rows, train_rows = order[:n_test], order[n_test:]
+        print(f"Streaming {len(train_rows)} rows in chunks of {chunk_rows}...")
+        clf = train_streaming(ds, train_rows, {k: v for k, v in params.items() if k != "n_estimators"},
+                              chunk_rows, trees_per_chunk)
+        X_test, y_test = next(ds.iter_complete(test_rows, len(test_rows)))
+    else:
+        # Features and Target (rows with missing values dropped)
+        X, y = ds.complete()
+        print(f"Classes: {np.unique(y)}")
+
+        # Train/Test
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+        # Model
+        clf = RandomForestClassifier(random_state=42, **params)
+        clf.fit(X_train, y_train)
+
     # Evaluate
     print("Training complete. Evaluation:")
     y_pred = clf.predict(X_test)
     print(classification_report(y_test, y_pred))
-    
-    # Save
-    with open("emotion_model.pkl", "wb") as f:
+    print(f"Flat inference latency: {inference_latency(clf, X_test):.1f}us p50 per event")
+
+    # Flat NumPy export for the real-time path, checked against sklearn
+    # before either model is saved
+    clf.feature_scale_ = feature_scale
+    forest = FlatForest.from_sklearn(clf)
+    ok, agreement, max_diff = check_parity(clf, forest, X_test)
+    print(f"Flat model parity: {agreement * 100:.2f}% labels match, max proba diff {max_diff:.2e}")
+    if not ok:
+        print("Error: flat model does not match the sklearn model, nothing saved")
+        return False
+
+    # Save (with the runtime feature scaling the model expects)
+    with open(os.path.join(MODEL_DIR, "emotion_model.pkl"), "wb") as f:
         pickle.dump(clf, f)
     print("Model saved to emotion_model.pkl")
+    forest.save(os.path.join(MODEL_DIR, "emotion_model.npz"))
+    print("Flat model saved to emotion_model.npz")
+    return True
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the emotion model")
+    parser.add_argument("--search", action="store_true",
+                        help="Parallel cross-validated hyperparameter search; reports accuracy and inference latency")
+    parser.add_argument("--max-latency-us", type=float, default=None,
+                        help="With --search, pick the most accurate model under this p50 latency")
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=-1,
+                        help="Search worker processes (default: all cores)")
+    parser.add_argument("--search-rows", type=int, default=200000,
+                        help="Rows sampled for the search")
+    parser.add_argument("--chunk-rows", type=int, default=None,
+                        help="Stream the training set from the dataset cache in chunks of N rows "
+                             "(trees per chunk replace n_estimators)")
+    parser.add_argument("--trees-per-chunk", type=int, default=10)
+    parser.add_argument("--feature-scale", type=float, default=FEATURE_SCALE,
+                        help="Scale from runtime AU ratios to dataset units, saved with the model")
+    args = parser.parse_args()
+
+    ok = train_model(do_search=args.search, chunk_rows=args.chunk_rows, trees_per_chunk=args.trees_per_chunk,
+                max_latency_us=args.max_latency_us, workers=args.workers, n_folds=args.folds,
+                search_rows=args.search_rows, feature_scale=args.feature_scale)
+    if not ok:
+        sys.exit(1)
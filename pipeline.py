@@ -0,0 +1,185 @@
+import threading
+import queue
+import time
+import cv2
+from instrumentation import Metrics, draw_overlay
+
+# Passed down the queues when the source ends, after its last frame
+_EOF = object()
+
+class FramePipeline:
+    """
+    Runs capture, landmarking/detection and rendering as separate stages
+    connected by bounded queues, so a slow inference frame does not stall
+    capture.
+    
+    drop_policy:
+      'latest' - when a queue is full the oldest frame is dropped, so each
+                 stage always works on the freshest frame (lowest latency).
+      'block'  - the producer waits; no frames are lost (offline use).
+      
+    Timestamps are taken at capture time and carried with the frame, so
+    EventDetector durations stay accurate when later stages fall behind.
+    Capture and inference run on worker threads; rendering stays on the
+    calling thread (HighGUI requires it). Stage timings and drops go to
+    `metrics` (an instrumentation.Metrics, created if not given).
+    When the source ends, the frames already queued are still processed;
+    pressing 'q' stops at once.
+    """
+    def __init__(self, cap, face_mesh, extractor, detector, queue_size=2, drop_policy="latest",
+                 recorder=None, metrics=None, show_metrics=False):
+        if drop_policy not in ("latest", "block"):
+            raise ValueError(f"Unknown drop_policy: {drop_policy}")
+            
+        self.cap = cap
+        self.face_mesh = face_mesh
+        self.extractor = extractor
+        self.detector = detector
+        self.recorder = recorder
+        self.drop_policy = drop_policy
+        
+        self.capture_q = queue.Queue(maxsize=queue_size)
+        self.render_q = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        
+        # Stages: capture, inference, render, latency (capture -> on screen)
+        self.metrics = metrics or Metrics()
+        self.show_metrics = show_metrics
+        self.start_time = None
+        self.last_timestamp = 0.0
+
+    def _put(self, q, item, stage):
+        if self.drop_policy == "block":
+            while not self.stop_event.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+            return
+            
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                # Drop the stale frame and keep the latest one
+                try:
+                    q.get_nowait()
+                    self.metrics.drop(stage)
+                except queue.Empty:
+                    pass
+
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _run_stage(self, loop):
+        try:
+            loop()
+        except BaseException:
+            # A failed stage stops the others instead of leaving them waiting
+            self.stop_event.set()
+            raise
+
+    def _capture_loop(self):
+        while not self.stop_event.is_set():
+            t0 = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                self._put(self.capture_q, _EOF, "capture")
+                break
+            timestamp = time.time() - self.start_time
+            self.metrics.record("capture", time.perf_counter() - t0)
+            
+            self._put(self.capture_q, (frame, timestamp, t0), "capture")
+
+    def _inference_loop(self):
+        while not self.stop_event.is_set():
+            item = self._get(self.capture_q)
+            if item is None: break
+            if item is _EOF:
+                self._put(self.render_q, _EOF, "render")
+                break
+            frame, timestamp, t_capture = item
+            
+            t0 = time.perf_counter()
+            h, w, c = frame.shape
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            results = self.face_mesh.process(rgb_frame)
+            
+            events = []
+            if results.multi_face_landmarks:
+                landmarks = results.multi_face_landmarks[0].landmark
+                features = self.extractor.extract(landmarks, w, h)
+                if features:
+                    if self.recorder:
+                        self.recorder.record(timestamp, landmarks, w, h, features)
+                    events = self.detector.update(features, timestamp)
+            else:
+                # No face: keep the event sink flushing
+                self.detector.poll()
+            self.metrics.record("inference", time.perf_counter() - t0)
+            
+            self.last_timestamp = timestamp
+            item = (frame, timestamp, t_capture, self.detector.calibration_done, events)
+            self._put(self.render_q, item, "render")
+
+    def run(self):
+        """
+        Runs until 'q' is pressed or the source ends.
+        Returns the session duration (capture time of the last processed frame).
+        """
+        self.start_time = time.time()
+        workers = [
+            threading.Thread(target=self._run_stage, args=(self._capture_loop,), daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._inference_loop,), daemon=True)
+        ]
+        for t in workers: t.start()
+        
+        while not self.stop_event.is_set():
+            item = self._get(self.render_q)
+            if item is None or item is _EOF: break
+            frame, timestamp, t_capture, calibrated, events = item
+            
+            t0 = time.perf_counter()
+            status_text = "Monitoring" if calibrated else "Calibrating..."
+            if calibrated and events:
+                cv2.putText(frame, "EVENT DETECTED", (50, 100),
+                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                print(f"[{timestamp:.2f}s] Event: {events[-1].au_type}")
+                
+            color = (0, 255, 255) if not calibrated else (0, 255, 0)
+            cv2.putText(frame, f"Status: {status_text}", (20, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+            if self.show_metrics:
+                draw_overlay(frame, self.metrics)
+            cv2.imshow("Micro-Expression Observer", frame)
+            
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                self.stop_event.set()
+            now = time.perf_counter()
+            self.metrics.record("render", now - t0)
+            self.metrics.record("latency", now - t_capture)
+            self.metrics.frame()
+            
+        # Workers only block in bounded waits that check stop_event; joining
+        # them fully keeps recorder/detector teardown after their last use
+        self.stop_event.set()
+        for t in workers: t.join()
+        return self.last_timestamp
+
+    def stats(self):
+        """
+        Per-stage timing and drop counters, as a plain dict.
+        """
+        return self.metrics.summary()
+
+    def print_stats(self):
+        print("\n--- PIPELINE STATS ---")
+        for line in self.metrics.report_lines():
+            print(line)
@@ -0,0 +1,192 @@
+import os
+import json
+import argparse
+import numpy as np
+
+from feature_extraction import FeatureExtractor, AU_KEYS
+from detector import EventDetector
+from report_generator import ReportGenerator
+
+class SessionRecorder:
+    """
+    Records a session for FaceMesh-free reprocessing.
+    
+    A session is a directory of raw column files that are appended in
+    chunks and can be memory-mapped on replay:
+      timestamps.f64 - capture time of each frame with a face (float64)
+      data.f32       - normalized landmarks (frames, n_landmarks, 2), float32
+                       as MediaPipe returns them ('landmarks' mode), or
+      data.f64       - AU vectors (frames, 5) ('features' mode)
+      meta.json      - mode, frame shape, dtype, image size
+    Frames are only appended whole, so a crashed session is still readable.
+    """
+    def __init__(self, path, mode="landmarks", image_size=None, n_landmarks=478, chunk_frames=256):
+        if mode not in ("landmarks", "features"):
+            raise ValueError(f"Unknown recording mode: {mode}")
+        os.makedirs(path, exist_ok=True)
+        
+        self.path = path
+        self.mode = mode
+        self.chunk_frames = chunk_frames
+        self.frames = 0
+        
+        if mode == "landmarks":
+            self.frame_shape = (n_landmarks, 2)
+            self.dtype = np.float32
+            data_name = "data.f32"
+        else:
+            self.frame_shape = (len(AU_KEYS),)
+            self.dtype = np.float64
+            data_name = "data.f64"
+            
+        self.meta = {
+            "mode": mode,
+            "frame_shape": list(self.frame_shape),
+            "dtype": np.dtype(self.dtype).name,
+            "data_file": data_name,
+            "image_size": list(image_size) if image_size else None,
+            "au_keys": AU_KEYS
+        }
+        self._write_meta()
+        
+        self._ts_file = open(os.path.join(path, "timestamps.f64"), "wb")
+        self._data_file = open(os.path.join(path, data_name), "wb")
+        
+        # Preallocated chunk, written out when full
+        self._ts = np.empty(chunk_frames)
+        self._data = np.empty((chunk_frames,) + self.frame_shape, dtype=self.dtype)
+        self._n = 0
+
+    def _write_meta(self):
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(self.meta, f, indent=2)
+
+    def record(self, timestamp, landmarks=None, image_w=None, image_h=None, features=None):
+        """
+        Appends one frame. 'landmarks' mode needs the NormalizedLandmark list
+        or a roi.LandmarkArray (and the image size, stored once); 'features' mode needs the AU
+        vector or features dict.
+        """
+        row = self._data[self._n]
+        if self.mode == "landmarks":
+            if self.meta["image_size"] is None:
+                self.meta["image_size"] = [image_w, image_h]
+                self._write_meta()
+            n = min(len(landmarks), self.frame_shape[0])
+            points = getattr(landmarks, "points", None) # roi.LandmarkArray
+            if points is not None:
+                row[:n] = points[:n]
+            else:
+                for i in range(n):
+                    lm = landmarks[i]
+                    row[i, 0] = lm.x
+                    row[i, 1] = lm.y
+            row[n:] = np.nan
+        elif isinstance(features, dict):
+            row[:] = [features[k] for k in AU_KEYS]
+        else:
+            row[:] = features
+            
+        self._ts[self._n] = timestamp
+        self._n += 1
+        if self._n == self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        if self._n == 0: return
+        self._data[:self._n].tofile(self._data_file)
+        self._ts[:self._n].tofile(self._ts_file)
+        self._data_file.flush()
+        self._ts_file.flush()
+        self.frames += self._n
+        self._n = 0
+
+    def close(self):
+        self.flush()
+        self._ts_file.close()
+        self._data_file.close()
+        self.meta["frames"] = self.frames
+        self._write_meta()
+        print(f"[System] Recorded {self.frames} frames to {self.path}")
+
+def load_session(path):
+    """
+    Memory-maps a recorded session.
+    Returns (meta, timestamps (frames,), data (frames, ...)).
+    """
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+        
+    frame_shape = tuple(meta["frame_shape"])
+    dtype = np.dtype(meta["dtype"])
+    ts_path = os.path.join(path, "timestamps.f64")
+    data_path = os.path.join(path, meta["data_file"])
+    
+    # Frame count from file sizes (meta may be stale after a crash)
+    row_bytes = dtype.itemsize * int(np.prod(frame_shape))
+    n = min(os.path.getsize(ts_path) // 8, os.path.getsize(data_path) // row_bytes)
+    if n == 0:
+        return meta, np.zeros(0), np.zeros((0,) + frame_shape, dtype=dtype)
+        
+    timestamps = np.memmap(ts_path, dtype=np.float64, mode="r", shape=(n,))
+    data = np.memmap(data_path, dtype=dtype, mode="r", shape=(n,) + frame_shape)
+    return meta, timestamps, data
+
+def replay(path, detector=None, extractor=None, chunk_frames=4096):
+    """
+    Feeds a recorded session through FeatureExtractor / EventDetector,
+    without MediaPipe. Landmark sessions are converted to AU vectors in
+    batches. Returns (detector, session duration).
+    """
+    meta, timestamps, data = load_session(path)
+    detector = detector or EventDetector(buffer_duration=3.0, classify="deferred")
+    extractor = extractor or FeatureExtractor()
+    
+    for s in range(0, len(timestamps), chunk_frames):
+        ts = timestamps[s:s + chunk_frames]
+        if meta["mode"] == "landmarks":
+            w, h = meta["image_size"]
+            feats = extractor.extract_batch(data[s:s + chunk_frames], w, h)
+        else:
+            feats = data[s:s + chunk_frames]
+            
+        for t, vec in zip(ts.tolist(), feats):
+            if np.isnan(vec[0]): continue # degenerate face (IOD == 0)
+            detector.update_vector(vec, t)
+            
+    detector.flush()
+    duration = float(timestamps[-1]) if len(timestamps) else 0.0
+    return detector, duration
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-analyse a recorded session without FaceMesh")
+    parser.add_argument("session", help="Session directory written by --record")
+    parser.add_argument("--z-threshold", type=float, default=2.0)
+    parser.add_argument("--min-duration", type=float, default=0.1)
+    parser.add_argument("--max-duration", type=float, default=1.0)
+    parser.add_argument("--baseline", choices=["static", "welford", "ewma"], default="static")
+    parser.add_argument("--smoothing", choices=["none", "ema", "one_euro", "savgol"], default="none",
+                        help="Smooth the AU features before Z-scoring")
+    parser.add_argument("--z-exit", type=float, default=None,
+                        help="Hysteresis: events close at or below this Z")
+    parser.add_argument("--style", choices=["plain", "technical"], default="plain")
+    parser.add_argument("--output", default=None, help="Report file (default: print only)")
+    args = parser.parse_args()
+    
+    detector = EventDetector(buffer_duration=3.0, classify="deferred", baseline=args.baseline,
+                             smoothing=args.smoothing, z_exit=args.z_exit)
+    detector.Z_THRESHOLD = args.z_threshold
+    detector.MIN_DURATION = args.min_duration
+    detector.MAX_DURATION = args.max_duration
+    
+    detector, duration = replay(args.session, detector)
+    if args.smoothing != "none" or args.z_exit is not None:
+        counts = detector.transition_counts
+        print(f"[System] {counts['opened']} event onsets ({counts['raw_opened'] or counts['opened']} unsmoothed), "
+              f"{counts['held']} dips held open, {counts['too_short']} too short")
+    report = ReportGenerator(style=args.style).generate(detector.event_log, duration)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    print(report)
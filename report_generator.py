@@ -1,58 +1,211 @@
 from detector import MicroEvent
+from feature_extraction import AU_KEYS
+from event_store import EventStore, merge_summaries, DURATION_BINS, INTENSITY_BINS
 import time
+import heapq
+
+# AU codes in plain English
+AU_DESCRIPTIONS = {
+    "AU01": "brief eyebrow raise",
+    "AU04": "brow lowering",
+    "AU06": "eye narrowing",
+    "AU12": "lip corner pull",
+    "AU15": "lip corner depression"
+}
 
 class ReportGenerator:
     def __init__(self, style="plain"):
         self.style = style # 'plain' or 'technical'
         
-    def generate(self, events, session_duration):
-        lines = []
-        lines.append("MICRO-EXPRESSION OBSERVATION REPORT")
-        lines.append("===================================")
-        lines.append(f"Date: {time.ctime()}")
-        lines.append(f"Duration: {session_duration:.1f} seconds")
-        lines.append(f"Events Detected: {len(events)}")
-        lines.append("-" * 40)
+    def _header(self, session_duration, n_events):
+        return [
+            "MICRO-EXPRESSION OBSERVATION REPORT",
+            "===================================",
+            f"Date: {time.ctime()}",
+            f"Duration: {session_duration:.1f} seconds",
+            f"Events Detected: {n_events}",
+            "-" * 40,
+        ]
+        
+    def _performance(self, metrics):
+        return ["", "PERFORMANCE", "-" * 40] + metrics.report_lines()
+        
+    def generate(self, events, session_duration, metrics=None):
+        """
+        metrics: optional instrumentation.Metrics; adds a performance section.
+        """
+        lines = self._header(session_duration, len(events))
         lines.append("")
         
-        if not events:
-            lines.append("No significant facial micro-movements detected exceeding baseline thresholds.")
-            return "\n".join(lines)
+        lines.append(self._generate_body(events))
+        if events:
+            lines.extend(self._summary_lines(self._summary(events), session_duration))
+                
+        if metrics is not None:
+            lines.extend(self._performance(metrics))
             
-        # Sort by time
-        events.sort(key=lambda x: x.start_time)
+        return "\n".join(lines)
+
+    def generate_multi(self, subject_logs, session_duration, metrics=None):
+        """
+        Report split per subject. subject_logs: {subject_id: events}.
+        """
+        total = sum(len(events) for events in subject_logs.values())
+        lines = self._header(session_duration, total)
+        lines.insert(4, f"Subjects: {len(subject_logs)}")
         
-        if self.style == "plain":
-            lines.append(self._generate_plain(events))
-        else:
-            lines.append(self._generate_technical(events))
+        for subject_id, events in subject_logs.items():
+            lines.append("")
+            lines.append(f"SUBJECT {subject_id} ({len(events)} events)")
+            lines.append("-" * 40)
+            lines.append(self._generate_body(events))
+            if events:
+                lines.extend(self._summary_lines(self._summary(events), session_duration))
+            
+        if metrics is not None:
+            lines.extend(self._performance(metrics))
             
         return "\n".join(lines)
 
-    def _generate_plain(self, events):
-        buffer = []
-        for e in events:
-            # Map AU to plain English
-            desc = "unknown movement"
-            if e.au_type == "AU01": desc = "brief eyebrow raise"
-            elif e.au_type == "AU04": desc = "brow lowering"
-            elif e.au_type == "AU06": desc = "eye narrowing"
-            elif e.au_type == "AU12": desc = "lip corner pull"
-            elif e.au_type == "AU15": desc = "lip corner depression"
-            
-            intensity = "slight"
-            if e.intensity_z > 3.0: intensity = "distinct"
+    def stream(self, events_path, session_duration=None, metrics=None, reorder_window=1.0, offset=0):
+        """
+        Yields the report lines for an event log written by
+        event_sink.EventSink, in constant memory: one pass counts the
+        events, a second formats them. Events are logged in close order;
+        a small heap puts them back in start order, which is safe because
+        a start is never more than reorder_window (the detector's
+        MAX_DURATION) before the close of the events logged after it.
+        session_duration defaults to the last event's end time. offset
+        skips earlier sessions in the log (EventSink.start_offset).
+        """
+        from event_sink import read_events
+        
+        # Pass 1: count and aggregate, one fixed-size chunk at a time
+        n_events, last_end, summary = 0, 0.0, None
+        chunk = EventStore(4096)
+        for e in read_events(events_path, offset):
+            n_events += 1
+            last_end = max(last_end, e.end_time)
+            chunk.append(e)
+            if len(chunk) == 4096:
+                summary = merge_summaries(summary, chunk.summary())
+                chunk = EventStore(4096)
+        if len(chunk):
+            summary = merge_summaries(summary, chunk.summary())
+        if session_duration is None:
+            session_duration = last_end
             
-            buffer.append(f"At {e.start_time:.1f}s, a {intensity} {desc} was observed (duration: {e.duration*1000:.0f}ms). Predicted Context: {e.emotion_label}.")
+        yield from self._header(session_duration, n_events)
+        yield ""
+        
+        if n_events == 0:
+            yield "No significant facial micro-movements detected exceeding baseline thresholds."
+        else:
+            format_line = self._plain_line
+            if self.style != "plain":
+                yield from self._technical_header()
+                format_line = self._technical_line
+                
+            heap = []
+            seq = 0 # tie-breaker: keeps log order for equal start times
+            for e in read_events(events_path, offset):
+                horizon = e.end_time - reorder_window
+                while heap and heap[0][0] < horizon:
+                    yield format_line(*_row(heapq.heappop(heap)[2]))
+                heapq.heappush(heap, (e.start_time, seq, e))
+                seq += 1
+            while heap:
+                yield format_line(*_row(heapq.heappop(heap)[2]))
+            yield from self._summary_lines(summary, session_duration)
+                
+        if metrics is not None:
+            yield from self._performance(metrics)
+
+    def write_report(self, events_path, report_path, session_duration=None, metrics=None,
+                     reorder_window=1.0, offset=0):
+        """
+        Writes the streamed report (see stream) to report_path line by line.
+        """
+        with open(report_path, "w") as f:
+            for line in self.stream(events_path, session_duration, metrics, reorder_window, offset):
+                f.write(line + "\n")
+
+    def _generate_body(self, events):
+        if not events:
+            return "No significant facial micro-movements detected exceeding baseline thresholds."
             
-        return "\n".join(buffer)
+        # Sort by time
+        if isinstance(events, EventStore):
+            rows = events.sorted_rows()
+        else:
+            events.sort(key=lambda x: x.start_time)
+            rows = map(_row, events)
+        
+        if self.style == "plain":
+            return self._generate_plain(rows)
+        return self._generate_technical(rows)
 
-    def _generate_technical(self, events):
-        buffer = []
-        buffer.append(f"{'Time':<10} | {'AU Code':<10} | {'Intensity (Z)':<15} | {'Emotion':<12} | {'Duration'}")
-        buffer.append("-" * 75)
+    def _plain_line(self, start, au_type, intensity_z, duration, label):
+        desc = AU_DESCRIPTIONS.get(au_type, "unknown movement")
         
-        for e in events:
-            buffer.append(f"{e.start_time:<10.2f} | {e.au_type:<10} | {e.intensity_z:<15.2f} | {e.emotion_label:<12} | {e.duration:.3f}s")
-            
+        intensity = "slight"
+        if intensity_z > 3.0: intensity = "distinct"
+        
+        return f"At {start:.1f}s, a {intensity} {desc} was observed (duration: {duration*1000:.0f}ms). Predicted Context: {label}."
+
+    def _generate_plain(self, rows):
+        return "\n".join(self._plain_line(*r) for r in rows)
+
+    def _technical_header(self):
+        return [
+            f"{'Time':<10} | {'AU Code':<10} | {'Intensity (Z)':<15} | {'Emotion':<12} | {'Duration'}",
+            "-" * 75
+        ]
+
+    def _technical_line(self, start, au_type, intensity_z, duration, label):
+        return f"{start:<10.2f} | {au_type:<10} | {intensity_z:<15.2f} | {label:<12} | {duration:.3f}s"
+
+    def _generate_technical(self, rows):
+        buffer = self._technical_header()
+        for r in rows:
+            buffer.append(self._technical_line(*r))
         return "\n".join(buffer)
+
+    def _summary(self, events):
+        if not isinstance(events, EventStore):
+            events = EventStore.from_events(events)
+        return events.summary()
+
+    def _summary_lines(self, summary, session_duration):
+        """
+        Formats an EventStore.summary(): per-AU counts and rate per minute,
+        duration/intensity histograms and the emotion breakdown.
+        """
+        minutes = max(session_duration, 1e-9) / 60.0
+        lines = ["", "SUMMARY", "-" * 40]
+        lines.append(f"{'AU Code':<8} | {'Movement':<22} | {'Count':>6} | {'Per Minute':>10}")
+        for au, count in zip(AU_KEYS, summary["au_counts"]):
+            lines.append(f"{au:<8} | {AU_DESCRIPTIONS[au]:<22} | {count:>6} | {count / minutes:>10.2f}")
+        lines.append(f"{'All':<8} | {'':<22} | {summary['events']:>6} | {summary['events'] / minutes:>10.2f}")
+        
+        lines.append("")
+        lines.append("Duration:      " + " | ".join(
+            f"{_bin_label(lo * 1000, hi * 1000, 'ms')}: {c}"
+            for lo, hi, c in zip(DURATION_BINS, DURATION_BINS[1:], summary["duration_hist"])))
+        lines.append("Intensity (Z): " + " | ".join(
+            f"{_bin_label(lo, hi, '')}: {c}"
+            for lo, hi, c in zip(INTENSITY_BINS, INTENSITY_BINS[1:], summary["intensity_hist"])))
+        
+        total = max(summary["events"], 1)
+        emotions = sorted(summary["emotions"].items(), key=lambda kv: -kv[1])
+        lines.append("Emotions:      " + ", ".join(
+            f"{label} {c} ({100.0 * c / total:.0f}%)" for label, c in emotions))
+        return lines
+
+def _row(e):
+    return (e.start_time, e.au_type, e.intensity_z, e.duration, e.emotion_label)
+
+def _bin_label(lo, hi, unit):
+    if lo == 0: return f"<{hi:g}{unit}"
+    if hi == float("inf"): return f">={lo:g}{unit}"
+    return f"{lo:g}-{hi:g}{unit}"
@@ -0,0 +1,157 @@
+import numpy as np
+import cv2
+
+# Face extent landmarks (forehead, chin, left/right face edge) for the ROI box
+FACE_EXTENT_IDX = [10, 152, 234, 454]
+
+class _Point:
+    __slots__ = ("x", "y", "z")
+
+class LandmarkArray:
+    """
+    Read-only landmark sequence backed by an (N, 2) array of normalized
+    full-frame coordinates, duck-typed like MediaPipe's landmark list
+    (items have .x / .y / .z), so FeatureExtractor and SessionRecorder
+    accept it unchanged. Landmarks that were not gathered are NaN.
+    """
+    def __init__(self, points):
+        self.points = points
+        
+    def __len__(self):
+        return len(self.points)
+        
+    def __getitem__(self, i):
+        p = _Point()
+        p.x = float(self.points[i, 0])
+        p.y = float(self.points[i, 1])
+        p.z = 0.0
+        return p
+
+class _Face:
+    __slots__ = ("landmark",)
+    def __init__(self, landmark):
+        self.landmark = landmark
+
+class _Results:
+    __slots__ = ("multi_face_landmarks",)
+    def __init__(self, faces):
+        self.multi_face_landmarks = faces
+
+class RoiLandmarker:
+    """
+    Runs FaceMesh on a crop around the face instead of the full frame.
+    
+    The crop comes from the previous frame's landmarks (padded bounding
+    box) and is only moved when the face nears its border or changes size,
+    so FaceMesh's own tracking stays valid. The crop is downscaled to at
+    most max_side pixels before colour conversion and landmarking, and the
+    landmarks are mapped back to normalized full-frame coordinates, so
+    FeatureExtractor's image_w/image_h scaling still works. The full frame
+    is used until a face is found, and again whenever it is lost.
+    
+    With skip_every=N, every Nth frame skips landmarking when the face is
+    steady (motion per frame below steady_threshold IODs between the last
+    two measured frames) and extrapolates the landmarks from those frames,
+    scaled by how many frames apart they were.
+    
+    process() returns an object shaped like FaceMesh results. Only the
+    landmarks in `indices` are gathered (default: the feature landmarks and
+    the face extent); the others are NaN.
+    """
+    def __init__(self, face_mesh, indices, n_landmarks=478, padding=0.3, max_side=320,
+                 skip_every=0, steady_threshold=0.02, iod_pair=(33, 263)):
+        self.face_mesh = face_mesh
+        self.indices = np.array(sorted(set(indices) | set(FACE_EXTENT_IDX) | set(iod_pair)))
+        self.extent_idx = np.array(FACE_EXTENT_IDX)
+        self.n_landmarks = n_landmarks
+        self.padding = padding
+        self.max_side = max_side
+        self.skip_every = skip_every
+        self.steady_threshold = steady_threshold
+        self.iod_pair = iod_pair
+        
+        self.roi = None # (x0, y0, x1, y1) in pixels
+        self._last = None
+        self._prev = None
+        self._last_idx = 0 # frame_idx of each measurement
+        self._prev_idx = 0
+        self.frame_idx = 0
+        self.skipped = 0
+        self.full_frame = 0
+
+    def _steady(self, w, h):
+        scale = np.array([w, h])
+        last = self._last[self.indices] * scale
+        prev = self._prev[self.indices] * scale
+        a, b = self.iod_pair
+        iod = np.linalg.norm((self._last[a] - self._last[b]) * scale)
+        if iod == 0: return False
+        gap = self._last_idx - self._prev_idx
+        return np.abs(last - prev).max() / gap / iod < self.steady_threshold
+
+    def _update_roi(self, pts, w, h):
+        ext = pts[self.extent_idx] * (w, h)
+        bx0, by0 = ext.min(axis=0)
+        bx1, by1 = ext.max(axis=0)
+        size = max(bx1 - bx0, by1 - by0) * (1 + 2 * self.padding)
+        
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            margin = 0.25 * self.padding * size
+            inside = (bx0 - margin >= x0 and by0 - margin >= y0 and
+                      bx1 + margin <= x1 and by1 + margin <= y1)
+            ratio = size / max(x1 - x0, y1 - y0)
+            if inside and 0.8 <= ratio <= 1.25:
+                return # keep the crop stable
+                
+        cx, cy = (bx0 + bx1) / 2, (by0 + by1) / 2
+        half = size / 2
+        x0, y0 = int(max(cx - half, 0)), int(max(cy - half, 0))
+        x1, y1 = int(min(cx + half, w)), int(min(cy + half, h))
+        self.roi = (x0, y0, x1, y1) if x1 - x0 > 16 and y1 - y0 > 16 else None
+
+    def process(self, frame):
+        h, w = frame.shape[:2]
+        self.frame_idx += 1
+        
+        # Steady face: skip landmarking, extrapolate from the last two frames
+        if (self.skip_every > 1 and self.frame_idx % self.skip_every == 0
+                and self._prev is not None and self._steady(w, h)):
+            self.skipped += 1
+            velocity = (self._last - self._prev) / (self._last_idx - self._prev_idx)
+            pts = self._last + velocity * (self.frame_idx - self._last_idx)
+            return _Results([_Face(LandmarkArray(pts))])
+            
+        if self.roi is None:
+            x0, y0, x1, y1 = 0, 0, w, h
+            self.full_frame += 1
+        else:
+            x0, y0, x1, y1 = self.roi
+        crop = frame[y0:y1, x0:x1]
+        cw, ch = x1 - x0, y1 - y0
+        
+        scale = self.max_side / max(cw, ch)
+        if scale < 1.0:
+            crop = cv2.resize(crop, (max(int(cw * scale), 1), max(int(ch * scale), 1)),
+                              interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        results = self.face_mesh.process(rgb)
+        
+        if not results.multi_face_landmarks:
+            # Lost: search the full frame next time
+            self.roi = None
+            self._last = self._prev = None
+            return _Results(None)
+            
+        # Crop-normalized -> full-frame normalized (resizing keeps normalized coords)
+        landmarks = results.multi_face_landmarks[0].landmark
+        pts = np.full((self.n_landmarks, 2), np.nan)
+        for i in self.indices:
+            lm = landmarks[i]
+            pts[i, 0] = (x0 + lm.x * cw) / w
+            pts[i, 1] = (y0 + lm.y * ch) / h
+            
+        self._prev, self._last = self._last, pts
+        self._prev_idx, self._last_idx = self._last_idx, self.frame_idx
+        self._update_roi(pts, w, h)
+        return _Results([_Face(LandmarkArray(pts))])
@@ -0,0 +1,312 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import numpy as np
+
+from feature_extraction import AU_KEYS
+from dataset_cache import AU_COLUMNS
+from detector import EventDetector, AU_DIRECTION, FEATURE_SCALE, MODEL_DIR
+from report_generator import ReportGenerator
+
+class SyntheticSession:
+    """
+    Long synthetic AU feature stream (FeatureExtractor units) with
+    micro-expression bursts at known times, for soak tests without a webcam.
+
+    Levels come from dataset statistics (data_loader.analyze_dataset):
+    the resting level is the dataset mean, per-frame jitter (noise) and a
+    slow drift (drift, ~10 min period) are fractions of the dataset std.
+    A burst is a half-sine on one AU, in the AU's direction, lasting 0.15-0.5s,
+    with a peak of intensity x (90th percentile - mean). Bursts are about
+    burst_every seconds apart (never overlapping) and start after calibration.
+    Frames are generated chunk by chunk, so hours of footage take no memory.
+    """
+    def __init__(self, stats, duration, fps=30.0, burst_every=10.0, intensity=(0.05, 0.3),
+                 noise=0.02, drift=0.01, calibration=3.0, seed=0):
+        mean = np.array([stats[c]["mean"] for c in AU_COLUMNS])
+        std = np.array([stats[c]["std"] for c in AU_COLUMNS])
+        high = np.array([stats[c]["high_threshold"] for c in AU_COLUMNS])
+
+        self.fps = fps
+        self.duration = duration
+        self.n_frames = int(duration * fps)
+        self.seed = seed
+        self.rest = mean / FEATURE_SCALE
+        self.noise = noise * std / FEATURE_SCALE
+        self.drift = drift * std / FEATURE_SCALE
+        self.amplitude = (high - mean) / FEATURE_SCALE * AU_DIRECTION
+
+        # Ground truth
+        rng = np.random.default_rng(seed)
+        n = int(duration / max(burst_every * 0.5, 1.0)) + 1
+        gaps = np.maximum(rng.uniform(0.5, 1.5, n) * burst_every, 1.0)
+        start = calibration + 1.0 + np.cumsum(gaps) - gaps[0]
+        start = start[start + 0.5 < duration]
+        n = len(start)
+        self.bursts = {
+            "start": start,
+            "end": start + rng.uniform(0.15, 0.5, n),
+            "au": rng.integers(len(AU_KEYS), size=n),
+            "intensity": rng.uniform(intensity[0], intensity[1], n)
+        }
+        self._phase = rng.uniform(0, 2 * np.pi, len(AU_KEYS))
+
+    def chunks(self, chunk_frames=1800):
+        """
+        Yields (timestamps (n,), features (n, AUs)) covering the session.
+        """
+        rng = np.random.default_rng(self.seed + 1)
+        b = self.bursts
+        for first in range(0, self.n_frames, chunk_frames):
+            n = min(chunk_frames, self.n_frames - first)
+            t = (first + np.arange(n)) / self.fps
+            X = self.rest + self.drift * np.sin(2 * np.pi * t[:, None] / 600.0 + self._phase)
+            X += self.noise * rng.normal(size=(n, len(AU_KEYS)))
+
+            # Bursts overlapping this chunk
+            lo = np.searchsorted(b["end"], t[0])
+            hi = np.searchsorted(b["start"], t[-1], side="right")
+            for k in range(lo, hi):
+                s, e, au = b["start"][k], b["end"][k], b["au"][k]
+                idx = np.nonzero((t >= s) & (t < e))[0]
+                X[idx, au] += (self.amplitude[au] * b["intensity"][k] *
+                               np.sin(np.pi * (t[idx] - s) / (e - s)))
+            yield t, X
+
+def _latency(samples_ns):
+    us = np.asarray(samples_ns, dtype=np.float64) / 1000.0
+    p50, p95, p99 = np.percentile(us, [50, 95, 99])
+    return {
+        "mean_us": float(us.mean()),
+        "p50_us": float(p50),
+        "p95_us": float(p95),
+        "p99_us": float(p99),
+        "max_us": float(us.max())
+    }
+
+def _event_arrays(detector, events_path):
+    """
+    (start, au index) arrays of every logged event.
+    """
+    if events_path:
+        from event_sink import read_events
+        events = list(read_events(events_path))
+        return (np.array([e.start_time for e in events]),
+                np.array([AU_KEYS.index(e.au_type) for e in events], dtype=int))
+    data = detector.event_log.data
+    return data["start_time"].copy(), data["au"].astype(int)
+
+def score(bursts, start, au, tolerance=0.2):
+    """
+    Matches detected events to the injected bursts. An event matches a
+    burst of the same AU if it starts within [burst start - tolerance,
+    burst end + tolerance]. Returns recall (overall and per AU), events
+    that match no burst (false) and bursts matched more than once (split).
+    """
+    res = {"bursts": int(len(bursts["start"])), "events": int(len(start)), "recall_per_au": {}}
+    hits = 0
+    false = 0
+    split = 0
+    for a, name in enumerate(AU_KEYS):
+        sel = bursts["au"] == a
+        lo = bursts["start"][sel] - tolerance
+        hi = bursts["end"][sel] + tolerance
+        ev = np.sort(start[au == a])
+
+        # Events per burst window (windows never overlap)
+        n = np.searchsorted(ev, hi, side="right") - np.searchsorted(ev, lo)
+        hits += int(np.count_nonzero(n))
+        split += int(np.count_nonzero(n > 1))
+        false += len(ev) - int(n.sum())
+        res["recall_per_au"][name] = float(np.count_nonzero(n) / len(n)) if len(n) else None
+
+    res["recall"] = hits / res["bursts"] if res["bursts"] else None
+    res["false_events"] = false
+    res["split_bursts"] = split
+    return res
+
+def soak(stats, hours=1.0, fps=30.0, window_minutes=10.0, trace_memory=True,
+         events_path=None, session_kwargs=None, **detector_kwargs):
+    """
+    Drives an EventDetector with a SyntheticSession of `hours` simulated
+    footage as fast as possible. Every window_minutes of simulated time it
+    records per-frame update latency, events so far, traced Python memory
+    (tracemalloc; adds overhead to the latencies) and the speed-up over
+    real time. At the end the events are scored against the injected
+    bursts and the report is generated (and timed).
+    With events_path the events go to an EventSink instead of memory.
+    """
+    session = SyntheticSession(stats, hours * 3600, fps, **(session_kwargs or {}))
+    sink = None
+    if events_path:
+        from event_sink import EventSink
+        if os.path.exists(events_path):
+            os.remove(events_path)
+        sink = EventSink(events_path)
+
+    if trace_memory:
+        tracemalloc.start()
+    detector = EventDetector(buffer_duration=3.0, sink=sink, **detector_kwargs)
+
+    window_frames = max(int(window_minutes * 60 * fps), 1)
+    samples = np.empty(window_frames, dtype=np.int64)
+    windows = []
+    k = 0
+    n_events = 0
+    clock = time.perf_counter_ns
+    wall = time.perf_counter()
+
+    def close_window(t_end):
+        nonlocal k, wall
+        now = time.perf_counter()
+        w = {"sim_minutes": t_end / 60.0, "frames": k, "events": n_events}
+        w.update(_latency(samples[:k]))
+        w["speedup"] = k / fps / (now - wall)
+        if trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            w["memory_kb"] = current / 1024
+            w["peak_memory_kb"] = peak / 1024
+            tracemalloc.reset_peak()
+        windows.append(w)
+        print(f"[Soak] {w['sim_minutes']:7.1f} min | {n_events:6d} events | p50 {w['p50_us']:6.1f}us | "
+              f"p99 {w['p99_us']:7.1f}us | x{w['speedup']:.0f} real time"
+              + (f" | {w['memory_kb']:9.1f} KB" if trace_memory else ""))
+        k = 0
+        wall = time.perf_counter()
+
+    t_last = 0.0
+    for t, X in session.chunks():
+        for i in range(len(t)):
+            t0 = clock()
+            n_events += len(detector.update_vector(X[i], t[i]))
+            samples[k] = clock() - t0
+            k += 1
+            if k == window_frames:
+                close_window(t[i])
+        t_last = t[-1]
+    if k:
+        close_window(t_last)
+
+    detector.close()
+    start, au = _event_arrays(detector, events_path)
+    result = {"detection": score(session.bursts, start, au),
+              "transitions": detector.transition_counts}
+
+    # Report over the whole session
+    gen = ReportGenerator(style="plain")
+    t0 = time.perf_counter()
+    if events_path:
+        gen.write_report(events_path, os.devnull, session.duration,
+                         reorder_window=detector.MAX_DURATION)
+    else:
+        gen.generate(detector.event_log, session.duration)
+    result["report_seconds"] = time.perf_counter() - t0
+
+    if trace_memory:
+        tracemalloc.stop()
+    result["windows"] = windows
+    result["trends"] = trends(windows, hours)
+    return result
+
+def trends(windows, hours):
+    """
+    Long-run drift: memory growth (KB per simulated hour, linear fit after
+    the first window) and p50/p99 latency of the last window relative to
+    the first full one (after calibration).
+    """
+    res = {}
+    steady = windows[1:] if len(windows) > 2 else windows
+    if len(steady) >= 2 and "memory_kb" in steady[0]:
+        h = [w["sim_minutes"] / 60.0 for w in steady]
+        res["memory_kb_per_hour"] = float(np.polyfit(h, [w["memory_kb"] for w in steady], 1)[0])
+    if len(steady) >= 2:
+        first, last = steady[0], steady[-1]
+        res["p50_drift"] = last["p50_us"] / first["p50_us"]
+        res["p99_drift"] = last["p99_us"] / first["p99_us"]
+    return res
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Soak test: hours of synthetic AU footage through the detector")
+    parser.add_argument("--hours", type=float, default=1.0, help="Simulated session length")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--window-minutes", type=float, default=10.0,
+                        help="Simulated minutes per latency/memory sample")
+    parser.add_argument("--burst-every", type=float, default=10.0,
+                        help="Mean seconds between injected micro-expressions")
+    parser.add_argument("--intensity", type=float, nargs=2, default=(0.05, 0.3), metavar=("MIN", "MAX"),
+                        help="Burst peak as a fraction of the dataset's 90th percentile above the mean")
+    parser.add_argument("--noise", type=float, default=0.02, help="Frame jitter (fraction of dataset std)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", choices=["static", "welford", "ewma"], default="static")
+    parser.add_argument("--smoothing", choices=["none", "ema", "one_euro", "savgol"], default="none")
+    parser.add_argument("--z-exit", type=float, default=None)
+    parser.add_argument("--classify", choices=["inline", "background", "deferred"], default="background")
+    parser.add_argument("--events", metavar="FILE", default=None,
+                        help="Stream events to FILE (JSONL) instead of keeping them in memory")
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="Skip memory tracing (lower per-frame overhead)")
+    parser.add_argument("--output", default="soak.json", help="Results file (JSON)")
+    parser.add_argument("--min-recall", type=float, default=None,
+                        help="Exit non-zero if recall is below this")
+    parser.add_argument("--max-drift", type=float, default=None,
+                        help="Exit non-zero if p50 latency grew by more than this ratio (e.g. 1.5)")
+    args = parser.parse_args()
+
+    from data_loader import analyze_dataset
+    stats = analyze_dataset(os.path.join(MODEL_DIR, "dataset.csv"))
+    if stats is None:
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    result = soak(stats, args.hours, args.fps, args.window_minutes,
+                  trace_memory=not args.no_tracemalloc, events_path=args.events,
+                  session_kwargs={"burst_every": args.burst_every, "intensity": args.intensity,
+                                  "noise": args.noise, "seed": args.seed},
+                  baseline=args.baseline, smoothing=args.smoothing, z_exit=args.z_exit,
+                  classify=args.classify)
+    elapsed = time.perf_counter() - t0
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "hours": args.hours,
+            "fps": args.fps,
+            "seed": args.seed,
+            "detector": {"baseline": args.baseline, "smoothing": args.smoothing,
+                         "z_exit": args.z_exit, "classify": args.classify},
+            "wall_seconds": elapsed
+        }
+    }
+    report.update(result)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    det = result["detection"]
+    trend = result["trends"]
+    print(f"\nRecall: {det['recall']:.3f} ({det['bursts']} bursts) | false events: {det['false_events']} | "
+          f"split bursts: {det['split_bursts']}")
+    print("Recall per AU: " + ", ".join(f"{k} {v:.2f}" for k, v in det["recall_per_au"].items() if v is not None))
+    if "memory_kb_per_hour" in trend:
+        print(f"Memory growth: {trend['memory_kb_per_hour']:.1f} KB per simulated hour")
+    if "p50_drift" in trend:
+        print(f"Latency drift (last/first window): p50 x{trend['p50_drift']:.2f}, p99 x{trend['p99_drift']:.2f}")
+    print(f"Report: {result['report_seconds'] * 1000:.1f}ms | {args.hours:g}h simulated in {elapsed:.1f}s "
+          f"(x{args.hours * 3600 / elapsed:.0f} real time)")
+    print(f"Results saved to {args.output}")
+
+    failed = False
+    if args.min_recall is not None and (det["recall"] or 0.0) < args.min_recall:
+        print(f"FAIL: recall {det['recall']:.3f} < {args.min_recall}")
+        failed = True
+    if args.max_drift is not None and trend.get("p50_drift", 1.0) > args.max_drift:
+        print(f"FAIL: p50 latency drift x{trend['p50_drift']:.2f} > x{args.max_drift}")
+        failed = True
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,636 @@
+import os
+import time
+import queue
+import argparse
+import threading
+import functools
+import multiprocessing
+import numpy as np
+
+from feature_extraction import FeatureExtractor, AU_KEYS
+from detector import MultiStreamDetector, preload_model
+from report_generator import ReportGenerator
+from instrumentation import LatencyHistogram
+from frame_transport import FrameRing
+
+class SyntheticSource:
+    """
+    Stand-in for a camera: a fixed BGR frame (slightly changed per frame)
+    delivered at `fps`, with the cv2.VideoCapture read/get/release API
+    (read(image) fills the given array, as cv2 does).
+    frames=None runs until released.
+    """
+    def __init__(self, width=640, height=480, fps=30.0, frames=None, seed=0):
+        rng = np.random.default_rng(seed)
+        self.base = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        self.fps = fps
+        self.frames = frames
+        self.count = 0
+        self.next_time = None
+        self.opened = True
+
+    def read(self, image=None):
+        if not self.opened or (self.frames is not None and self.count >= self.frames):
+            return False, None
+        now = time.perf_counter()
+        if self.next_time is None:
+            self.next_time = now
+        elif self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time += 1.0 / self.fps
+
+        if image is not None and image.shape == self.base.shape:
+            frame = image
+            np.copyto(frame, self.base)
+        else:
+            frame = self.base.copy()
+        frame[0, :8, 0] = self.count & 0xFF
+        self.count += 1
+        return True, frame
+
+    def get(self, prop):
+        # cv2.CAP_PROP_FRAME_WIDTH / FRAME_HEIGHT / FPS
+        return {3: self.base.shape[1], 4: self.base.shape[0]}.get(prop, self.fps)
+
+    def isOpened(self):
+        return self.opened
+
+    def release(self):
+        self.opened = False
+
+class _PacedCapture:
+    """
+    Video file played back at its own frame rate, so it behaves like a
+    live camera (frames not read in time are skipped, not queued).
+    """
+    def __init__(self, cap, fps):
+        self.cap = cap
+        self.fps = fps or 30.0
+        self.start = None
+        self.index = 0
+
+    def read(self, image=None):
+        now = time.perf_counter()
+        if self.start is None:
+            self.start = now
+        due = int((now - self.start) * self.fps)
+        # Skip frames a live camera would have produced while we were busy
+        while self.index < due:
+            if not self.cap.grab(): return False, None
+            self.index += 1
+        wait = self.start + self.index / self.fps - now
+        if wait > 0: time.sleep(wait)
+        self.index += 1
+        return self.cap.read(image)
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+def open_source(spec, realtime=True):
+    """
+    spec: camera index ("0"), video file path, or "synthetic[:WxH[@FPS]]".
+    Video files are paced to their frame rate when realtime is set.
+    """
+    if spec.startswith("synthetic"):
+        width, height, fps = 640, 480, 30.0
+        if ":" in spec:
+            size = spec.split(":", 1)[1]
+            if "@" in size:
+                size, fps = size.split("@")
+                fps = float(fps)
+            width, height = (int(v) for v in size.split("x"))
+        return SyntheticSource(width, height, fps)
+
+    import cv2
+    if spec.isdigit():
+        return cv2.VideoCapture(int(spec))
+    cap = cv2.VideoCapture(spec)
+    return _PacedCapture(cap, cap.get(cv2.CAP_PROP_FPS)) if realtime else cap
+
+class _Stream:
+    """
+    One input stream: its capture thread and a one-frame mailbox.
+    The mailbox holds only the newest frame (per-stream backpressure: a
+    stream that is not scheduled in time loses its stale frames, never
+    delays the others).
+    """
+    def __init__(self, slot, spec, source):
+        self.slot = slot
+        self.spec = spec
+        self.source = source
+        self.lock = threading.Lock()
+        self.frame = None
+        self.ended = False
+        self.busy = False
+        self.pending_t = None # capture time of the frame in flight
+        self.ring_frame = None # (ring slot, seq) of the frame in flight
+        self.task = 0 # id of the task in flight (late results of older ones are ignored)
+        self.dispatched_at = None
+        self.shape = None
+        self.start_time = None
+        self.thread = None
+
+        self.captured = 0
+        self.dropped = 0
+        self.processed = 0
+        self.faces = 0
+        self.errors = 0 # tasks that failed or timed out
+        self.first_result = None
+        self.last_result = None
+        self.latency = LatencyHistogram()
+
+    def put(self, frame, t):
+        """
+        Stores the newest frame; returns the one it replaced (or None).
+        """
+        with self.lock:
+            old = self.frame
+            if old is not None:
+                self.dropped += 1
+            self.frame = (frame, t)
+            self.captured += 1
+            return old
+
+    def drop(self):
+        """
+        Counts a frame that was read but had nowhere to go.
+        """
+        with self.lock:
+            self.captured += 1
+            self.dropped += 1
+
+    def take(self):
+        with self.lock:
+            item, self.frame = self.frame, None
+            return item
+
+# Worker process state (created once per worker by _init_worker)
+_face_mesh = None
+_extractor = None
+_synthetic = None
+_ring = None
+
+def _init_worker(synthetic_landmarks=False, ring_spec=None):
+    global _face_mesh, _extractor, _synthetic, _ring
+    _extractor = FeatureExtractor()
+    if ring_spec is not None:
+        _ring = FrameRing.attach(ring_spec)
+    if synthetic_landmarks:
+        # Fixed jittered face instead of FaceMesh (throughput tests without MediaPipe)
+        _synthetic = np.random.default_rng(os.getpid()).uniform(0.3, 0.7, size=(478, 2))
+        return
+    import mediapipe as mp
+    # Frames from many streams interleave on a worker, so no cross-frame tracking
+    _face_mesh = mp.solutions.face_mesh.FaceMesh(
+        static_image_mode=True,
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.5
+    )
+
+def _ping(_):
+    return os.getpid()
+
+def _process_frame(slot, frame):
+    """
+    Landmarks + features for one frame. Returns (slot, AU vector or None,
+    worker seconds); a failed frame counts as no face.
+    """
+    t0 = time.perf_counter()
+    try:
+        vec = _landmark_features(frame)
+    except Exception as e:
+        print(f"[Warning] Stream {slot} frame failed: {e}")
+        vec = None
+    return slot, vec, time.perf_counter() - t0
+
+def _process_slot(slot, ring_slot, seq):
+    """
+    Shared-memory variant of _process_frame: the frame is read in place
+    from the ring and the AU vector written back to its result row (not
+    if the slot was given up and released meanwhile).
+    Returns (slot, None, worker seconds).
+    """
+    t0 = time.perf_counter()
+    vec = None
+    frame = _ring.frame(ring_slot, seq)
+    if frame is not None:
+        try:
+            vec = _landmark_features(frame)
+        except Exception as e:
+            print(f"[Warning] Stream {slot} frame failed: {e}")
+    del frame
+    _ring.write_result(ring_slot, seq, vec)
+    return slot, None, time.perf_counter() - t0
+
+def _landmark_features(frame):
+    h, w = frame.shape[:2]
+    if _synthetic is not None:
+        points = _synthetic + np.random.normal(0, 0.0005, _synthetic.shape)
+        vec = _extractor.extract_batch(points, w, h)
+        vec = None if np.isnan(vec).any() else vec
+    else:
+        import cv2
+        results = _face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        vec = None
+        if results.multi_face_landmarks:
+            vec = _extractor.extract_vector(results.multi_face_landmarks[0].landmark, w, h)
+            if vec is not None: vec = vec.copy()
+    return vec
+
+class StreamServer:
+    """
+    Analyses several camera/video/synthetic streams on one host.
+
+    Each stream has its own capture thread. The dispatcher (run()) schedules
+    frames onto a shared pool of FaceMesh worker processes round-robin,
+    with at most one frame in flight per stream (fairness: a fast stream
+    cannot starve the others) and at most max_in_flight overall. Results
+    are folded into one MultiStreamDetector (one slot per stream) in a
+    single vectorized update per dispatcher pass. First face per stream.
+
+    transport="shm" (default) passes frames through a shared-memory
+    FrameRing: capture threads read straight into a ring slot and workers
+    get a view of it, so only slot numbers and AU vectors are pickled.
+    transport="pickle" sends each frame to the pool as an argument.
+
+    A task that fails, or has no result after task_timeout seconds (e.g.
+    its worker died), is given up: its stream gets the next frame and its
+    ring slot is freed (a late worker result for it is discarded).
+    """
+    def __init__(self, sources, workers=None, max_in_flight=None, realtime=True,
+                 synthetic_landmarks=False, baseline="static", classify="background",
+                 transport="shm", smoothing="none", z_exit=None, task_timeout=10.0):
+        self.specs = list(sources)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.realtime = realtime
+        self.synthetic_landmarks = synthetic_landmarks
+        self.transport = transport
+        self.task_timeout = task_timeout
+        self.ring = None
+
+        preload_model("flat")
+        self.detector = MultiStreamDetector(len(self.specs), buffer_duration=3.0,
+                                            classify=classify, baseline=baseline,
+                                            smoothing=smoothing, z_exit=z_exit)
+        self.streams = []
+        self.pool = None
+        self.results = queue.Queue()
+        self.stop_event = threading.Event()
+        self.in_flight = 0
+        self.worker_time = LatencyHistogram()
+        self.start_time = None
+        self.end_time = None
+        self._rr = 0
+
+    def start(self):
+        for slot, spec in enumerate(self.specs):
+            source = open_source(spec, self.realtime) if isinstance(spec, str) else spec
+            if not source.isOpened():
+                print(f"[Warning] Stream {slot} ({spec}) could not be opened.")
+            stream = _Stream(slot, spec, source)
+            # cv2.CAP_PROP_FRAME_HEIGHT / FRAME_WIDTH (0 if unknown)
+            stream.shape = (int(source.get(4)) or 1080, int(source.get(3)) or 1920, 3)
+            stream.thread = threading.Thread(target=self._capture_loop, args=(stream,), daemon=True)
+            self.streams.append(stream)
+
+        ring_spec = None
+        if self.transport == "shm":
+            # Enough slots for every frame in flight plus a mailbox and a
+            # frame being read per stream
+            slot_bytes = max(int(np.prod(s.shape)) for s in self.streams)
+            n_slots = self.max_in_flight + 2 * len(self.streams) + 2
+            self.ring = FrameRing(n_slots, slot_bytes, n_values=len(AU_KEYS))
+            ring_spec = self.ring.spec
+
+        ctx = multiprocessing.get_context("spawn")
+        self.pool = ctx.Pool(processes=self.workers, initializer=_init_worker,
+                             initargs=(self.synthetic_landmarks, ring_spec))
+        # Wait for the workers to come up before the clock starts
+        self.pool.map(_ping, range(self.workers))
+
+        self.start_time = time.perf_counter()
+        for stream in self.streams:
+            stream.start_time = time.perf_counter()
+            stream.thread.start()
+        print(f"[Server] {len(self.streams)} stream(s) on {self.workers} worker(s)")
+
+    def _capture_loop(self, stream):
+        if self.ring is not None:
+            self._capture_to_ring(stream)
+        else:
+            while not self.stop_event.is_set():
+                ret, frame = stream.source.read()
+                if not ret: break
+                stream.put(frame, time.perf_counter())
+        stream.ended = True
+
+    def _capture_to_ring(self, stream):
+        ring = self.ring
+        while not self.stop_event.is_set():
+            ring_slot = ring.acquire()
+            if ring_slot is None:
+                # Every slot is in use: keep the source moving, lose the frame
+                ret, _ = stream.source.read()
+                if not ret: break
+                stream.drop()
+                continue
+
+            view = ring.view(ring_slot, stream.shape)
+            ret, frame = stream.source.read(view)
+            if not ret:
+                ring.release(ring_slot)
+                break
+            if not np.shares_memory(frame, view):
+                # The source allocated its own frame (size changed, or no
+                # read-into support): copy it in if it fits
+                if frame.nbytes > ring.slot_bytes:
+                    ring.release(ring_slot)
+                    stream.drop()
+                    continue
+                ring.view(ring_slot, frame.shape)[...] = frame
+            seq = ring.publish(ring_slot, frame.shape)
+
+            old = stream.put((ring_slot, seq), time.perf_counter())
+            if old is not None:
+                ring.release(old[0][0])
+
+    def _on_result(self, slot, task, result):
+        _, vec, worker_seconds = result
+        self.results.put((slot, task, vec, worker_seconds))
+
+    def _on_error(self, slot, task, exc):
+        print(f"[Warning] Stream {slot} worker error: {exc}")
+        self.results.put((slot, task, None, None))
+
+    def _expire(self, X, ts, valid):
+        # Give up on tasks whose worker never answered
+        now = time.perf_counter()
+        for stream in self.streams:
+            if stream.busy and now - stream.dispatched_at > self.task_timeout:
+                print(f"[Warning] Stream {stream.slot} frame timed out after {self.task_timeout:g}s")
+                self._collect((stream.slot, stream.task, None, None), X, ts, valid)
+
+    def run(self, duration=None):
+        """
+        Dispatches until every source has ended, duration seconds have
+        passed or stop() is called. Returns stats().
+        """
+        if self.pool is None:
+            self.start()
+        deadline = None if duration is None else time.perf_counter() + duration
+
+        n = len(self.streams)
+        X = np.full((n, len(AU_KEYS)), np.nan)
+        ts = np.zeros(n)
+        valid = np.zeros(n, dtype=bool)
+
+        try:
+            while not self.stop_event.is_set():
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+
+                # Collect finished frames (wait briefly for the first one)
+                valid[:] = False
+                try:
+                    item = self.results.get(timeout=0.002)
+                    while True:
+                        self._collect(item, X, ts, valid)
+                        item = self.results.get_nowait()
+                except queue.Empty:
+                    pass
+
+                if valid.any():
+                    for slot, evt in self.detector.update(X, ts, valid):
+                        print(f"[Stream {slot}] {evt.start_time:.2f}s Event: {evt.au_type}")
+                    X[valid] = np.nan
+
+                self._expire(X, ts, valid)
+                self._dispatch()
+
+                if self.in_flight == 0 and all(s.ended and s.frame is None for s in self.streams):
+                    break
+        except KeyboardInterrupt:
+            pass
+        self.end_time = time.perf_counter()
+        return self.stats()
+
+    def _collect(self, item, X, ts, valid):
+        """
+        Ends a stream's task: frees its pool and ring slots, and stores its
+        AU vector. worker_seconds None = the task failed or timed out.
+        """
+        slot, task, vec, worker_seconds = item
+        stream = self.streams[slot]
+        if not stream.busy or task != stream.task:
+            return # late result of a task that was given up
+        self.in_flight -= 1
+        stream.busy = False
+        if stream.ring_frame is not None:
+            ring_slot, seq = stream.ring_frame
+            if worker_seconds is not None:
+                vec = self.ring.read_result(ring_slot, seq)
+            self.ring.release(ring_slot)
+            stream.ring_frame = None
+        if worker_seconds is None:
+            stream.errors += 1
+            return
+
+        now = time.perf_counter()
+        stream.processed += 1
+        stream.latency.add(now - stream.pending_t)
+        self.worker_time.add(worker_seconds)
+        if stream.first_result is None: stream.first_result = now
+        stream.last_result = now
+
+        if vec is not None:
+            stream.faces += 1
+            X[slot] = vec
+            ts[slot] = stream.pending_t - stream.start_time
+            valid[slot] = True
+
+    def _dispatch(self):
+        n = len(self.streams)
+        for k in range(n):
+            if self.in_flight >= self.max_in_flight: break
+            stream = self.streams[(self._rr + k) % n]
+            if stream.busy: continue
+            item = stream.take()
+            if item is None: continue
+
+            frame, t = item
+            stream.busy = True
+            stream.pending_t = t
+            stream.task += 1
+            stream.dispatched_at = time.perf_counter()
+            self.in_flight += 1
+            # Callbacks carry the stream and task, so a failure still frees the stream
+            callbacks = {"callback": functools.partial(self._on_result, stream.slot, stream.task),
+                         "error_callback": functools.partial(self._on_error, stream.slot, stream.task)}
+            if self.ring is not None:
+                stream.ring_frame = frame
+                self.pool.apply_async(_process_slot, (stream.slot,) + frame, **callbacks)
+            else:
+                self.pool.apply_async(_process_frame, (stream.slot, frame), **callbacks)
+        # Next pass starts at the following stream
+        self._rr = (self._rr + 1) % n
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        """
+        Per-stream capture/processed/dropped counts, processed FPS and
+        capture-to-result latency, plus totals.
+        """
+        elapsed = ((self.end_time or time.perf_counter()) - self.start_time) if self.start_time else 0.0
+        streams = []
+        for s in self.streams:
+            span = (s.last_result - s.first_result) if s.processed > 1 else 0.0
+            p50, p95, p99 = s.latency.percentiles()
+            streams.append({
+                "stream": s.slot,
+                "source": str(s.spec),
+                "captured": s.captured,
+                "processed": s.processed,
+                "dropped": s.dropped,
+                "errors": s.errors,
+                "faces": s.faces,
+                "fps": (s.processed - 1) / span if span > 0 else 0.0,
+                "latency_p50_ms": p50,
+                "latency_p95_ms": p95,
+                "events": len(self.detector.event_logs[s.slot])
+            })
+        total = sum(s["processed"] for s in streams)
+        return {
+            "streams": streams,
+            "elapsed": elapsed,
+            "workers": self.workers,
+            "total_fps": total / elapsed if elapsed > 0 else 0.0,
+            "worker_ms_p50": self.worker_time.percentiles((50,))[0],
+            "transitions": self.detector.transition_counts
+        }
+
+    def print_stats(self, stats=None):
+        stats = stats or self.stats()
+        print(f"{'Stream':<8} | {'Source':<20} | {'FPS':>6} | {'Captured':>8} | {'Dropped':>7} | "
+              f"{'p50 (ms)':>8} | {'p95 (ms)':>8} | {'Events':>6}")
+        print("-" * 96)
+        for s in stats["streams"]:
+            print(f"{s['stream']:<8} | {s['source'][-20:]:<20} | {s['fps']:>6.1f} | {s['captured']:>8} | "
+                  f"{s['dropped']:>7} | {s['latency_p50_ms']:>8.1f} | {s['latency_p95_ms']:>8.1f} | {s['events']:>6}")
+        print(f"Total: {stats['total_fps']:.1f} frames/s over {stats['elapsed']:.1f}s on "
+              f"{stats['workers']} worker(s), {stats['worker_ms_p50']:.1f}ms per frame (p50, worker)")
+        errors = sum(s["errors"] for s in stats["streams"])
+        if errors:
+            print(f"[Warning] {errors} frame(s) failed or timed out in the workers")
+
+    def write_reports(self, output_dir="reports", style="plain"):
+        os.makedirs(output_dir, exist_ok=True)
+        gen = ReportGenerator(style=style)
+        paths = []
+        for s in self.streams:
+            duration = (s.last_result or s.start_time) - s.start_time
+            path = os.path.join(output_dir, f"stream{s.slot}_report.txt")
+            with open(path, "w") as f:
+                f.write(gen.generate(self.detector.event_logs[s.slot], duration))
+            paths.append(path)
+        return paths
+
+    def close(self):
+        self.stop()
+        for s in self.streams:
+            s.thread.join(timeout=1.0)
+            s.source.release()
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        self.detector.close()
+
+def capacity_sweep(max_streams=32, duration=10.0, size=(640, 480), fps=30.0, workers=None,
+                   synthetic_landmarks=False, threshold=0.9, transport="shm"):
+    """
+    Runs 1, 2, 4, ... synthetic streams for `duration` seconds each and
+    reports whether every stream kept at least threshold * fps.
+    Returns the largest stream count that was sustained.
+    """
+    spec = f"synthetic:{size[0]}x{size[1]}@{fps:g}"
+    sustained = 0
+    n = 1
+    print(f"{'Streams':>7} | {'Min FPS':>7} | {'Total FPS':>9} | {'p95 (ms)':>8} | Sustained")
+    print("-" * 52)
+    while n <= max_streams:
+        server = StreamServer([spec] * n, workers=workers, synthetic_landmarks=synthetic_landmarks,
+                              transport=transport)
+        try:
+            stats = server.run(duration)
+        finally:
+            server.close()
+        min_fps = min(s["fps"] for s in stats["streams"])
+        p95 = max(s["latency_p95_ms"] for s in stats["streams"])
+        ok = min_fps >= threshold * fps
+        print(f"{n:>7} | {min_fps:>7.1f} | {stats['total_fps']:>9.1f} | {p95:>8.1f} | {'yes' if ok else 'no'}")
+        if not ok: break
+        sustained = n
+        n *= 2
+    print(f"[Server] Sustained {sustained} stream(s) at {fps:g} FPS ({size[0]}x{size[1]})")
+    return sustained
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-stream micro-expression analysis server")
+    parser.add_argument("--source", action="append", default=[],
+                        help="Camera index, video file or synthetic[:WxH[@FPS]] (repeat per stream)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="FaceMesh worker processes (default: one per core)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Frames queued to the pool at once (default: 2 per worker)")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Stop after N seconds (default: until all sources end / Ctrl+C)")
+    parser.add_argument("--task-timeout", type=float, default=10.0,
+                        help="Give up on a frame after N seconds without a worker result")
+    parser.add_argument("--no-realtime", action="store_true",
+                        help="Read video files as fast as possible instead of at their frame rate")
+    parser.add_argument("--synthetic-landmarks", action="store_true",
+                        help="Skip FaceMesh and use a synthetic face (pipeline throughput tests)")
+    parser.add_argument("--baseline", choices=["static", "welford", "ewma"], default="static")
+    parser.add_argument("--smoothing", choices=["none", "ema", "one_euro", "savgol"], default="none")
+    parser.add_argument("--z-exit", type=float, default=None)
+    parser.add_argument("--transport", choices=["shm", "pickle"], default="shm",
+                        help="How frames reach the workers: shared-memory ring or pickled copies")
+    parser.add_argument("--output-dir", default="reports")
+    parser.add_argument("--sweep", type=int, metavar="MAX_STREAMS", default=None,
+                        help="Find how many synthetic streams this host sustains (1, 2, 4, ... up to MAX_STREAMS)")
+    parser.add_argument("--sweep-duration", type=float, default=10.0)
+    parser.add_argument("--sweep-size", default="640x480@30",
+                        help="Synthetic frame size and rate for --sweep")
+    args = parser.parse_args()
+
+    if args.sweep:
+        size, fps = args.sweep_size.split("@")
+        width, height = (int(v) for v in size.split("x"))
+        capacity_sweep(args.sweep, args.sweep_duration, (width, height), float(fps),
+                       args.workers, args.synthetic_landmarks, transport=args.transport)
+    else:
+        server = StreamServer(args.source or ["0"], workers=args.workers,
+                              max_in_flight=args.max_in_flight, realtime=not args.no_realtime,
+                              synthetic_landmarks=args.synthetic_landmarks, baseline=args.baseline,
+                              transport=args.transport, smoothing=args.smoothing, z_exit=args.z_exit,
+                              task_timeout=args.task_timeout)
+        try:
+            stats = server.run(args.duration)
+        finally:
+            server.close()
+        server.print_stats(stats)
+        for path in server.write_reports(args.output_dir):
+            print(f"Report saved to {path}")